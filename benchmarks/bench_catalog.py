@@ -0,0 +1,59 @@
+# -----------------------------------------------------------------------------
+# Name:        bench_catalog.py
+# Purpose:     Catalog.find vs walking the tree with ls, and the cost of an
+#              incremental rescan
+#
+#   python benchmarks/bench_catalog.py
+# -----------------------------------------------------------------------------
+import os
+import time
+import shutil
+import tempfile
+from opensitua_http.filesystem import ls
+from opensitua_http.catalog import Catalog
+
+
+def make_tree(dirname, depth=4, fanout=5, files=20):
+    """
+    make_tree - fanout folders per level, files in each folder
+    """
+    for j in range(files):
+        open("%s/layer%d.%s" % (dirname, j, ("tif", "shp", "txt", "js")[j % 4]), "w").close()
+    if depth > 0:
+        for j in range(fanout):
+            subdir = "%s/dir%d" % (dirname, j)
+            os.mkdir(subdir)
+            make_tree(subdir, depth - 1, fanout, files)
+
+
+def bench(func, n=1):
+    t0 = time.perf_counter()
+    for j in range(n):
+        res = func()
+    return res, (time.perf_counter() - t0) / n * 1000
+
+
+if __name__ == "__main__":
+    root = tempfile.mkdtemp(prefix="bench_catalog")
+    try:
+        make_tree(root)
+        catalog = Catalog(root, root + ".sqlite")
+        stats, t = bench(catalog.rescan)
+        print("first scan        %8.1f ms   %s" % (t, stats))
+        stats, t = bench(catalog.rescan)
+        print("rescan, no change %8.1f ms   %s" % (t, stats))
+        open(root + "/dir1/dir2/new.tif", "w").close()
+        stats, t = bench(catalog.rescan)
+        print("rescan, one file  %8.1f ms   %s" % (t, stats))
+
+        res0, t0 = bench(lambda: ls(root, r'.*/layer5\.shp$'), 5)
+        res1, t1 = bench(lambda: catalog.find(name="layer5", ext="shp"), 100)
+        assert sorted(res0) == res1
+        print("by name   ls %8.2f ms   find %8.3f ms   %d files" % (t0, t1, len(res1)))
+        res0, t0 = bench(lambda: ls(root, r'.*\.tif$'), 5)
+        res1, t1 = bench(lambda: catalog.find(ext="tif"), 20)
+        assert sorted(res0) == res1
+        print("by ext    ls %8.2f ms   find %8.3f ms   %d files" % (t0, t1, len(res1)))
+    finally:
+        shutil.rmtree(root)
+        os.remove(root + ".sqlite")
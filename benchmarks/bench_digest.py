@@ -0,0 +1,52 @@
+# -----------------------------------------------------------------------------
+# Name:        bench_digest.py
+# Purpose:     filedigest vs reading the whole file, the digest cache and
+#              filedigests across a thread pool
+#
+#   python benchmarks/bench_digest.py [files] [size_mb]
+# -----------------------------------------------------------------------------
+import os,sys
+import time
+import shutil
+import hashlib
+import tempfile
+from opensitua_http.filesystem import filedigest, filedigests, invalidate_digest_cache
+
+
+def bench(func, n=1):
+    t0 = time.perf_counter()
+    for j in range(n):
+        res = func()
+    return res, (time.perf_counter() - t0) / n * 1000
+
+
+def whole(filename, algorithm):
+    with open(filename, "rb") as stream:
+        return hashlib.new(algorithm, stream.read()).hexdigest()
+
+
+if __name__ == "__main__":
+    nfiles = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    dirname = tempfile.mkdtemp(prefix="bench_digest")
+    try:
+        filenames = []
+        for j in range(nfiles):
+            filename = "%s/file%d.bin" % (dirname, j)
+            with open(filename, "wb") as stream:
+                stream.write(os.urandom(size * 1024 * 1024))
+            filenames.append(filename)
+
+        for algorithm in ("md5", "sha256", "blake2b"):
+            res0, t0 = bench(lambda: [whole(filename, algorithm) for filename in filenames])
+            invalidate_digest_cache()
+            res1, t1 = bench(lambda: [filedigest(filename, algorithm) for filename in filenames])
+            assert res0 == res1
+            invalidate_digest_cache()
+            res2, t2 = bench(lambda: filedigests(filenames, algorithm, workers=4))
+            assert res0 == [res2[filename] for filename in filenames]
+            _, t3 = bench(lambda: filedigests(filenames, algorithm, workers=4), 100)
+            print("%-8s %d x %d MB   whole read %8.1f ms   filedigest %8.1f ms   filedigests %8.1f ms   cached %8.3f ms" % (
+                algorithm, nfiles, size, t0, t1, t2, t3))
+    finally:
+        shutil.rmtree(dirname)
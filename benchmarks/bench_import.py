@@ -0,0 +1,39 @@
+# -----------------------------------------------------------------------------
+# Name:        bench_import.py
+# Purpose:     start-up cost of "import opensitua_http" and the heavy modules
+#              it loads, the limits are checked by tests/test_import.py
+#
+#   python benchmarks/bench_import.py
+# -----------------------------------------------------------------------------
+import sys
+import json
+import subprocess
+
+HEAVY = ("osgeo", "numpy", "opensitua_http.mapfile", "asyncio")
+
+CHILD = """
+import sys, time, json
+t0 = time.perf_counter()
+import opensitua_http
+from opensitua_http import Params, htmlResponse, JSONResponse, Router
+t1 = time.perf_counter()
+print(json.dumps({"ms": (t1 - t0) * 1000, "loaded": [name for name in %r if name in sys.modules]}))
+""" % (HEAVY,)
+
+
+def measure(n=5):
+    """
+    measure - the best import time of n fresh interpreters
+    """
+    best, loaded = None, []
+    for j in range(n):
+        out = subprocess.check_output([sys.executable, "-c", CHILD])
+        res = json.loads(out.decode("utf-8").strip().splitlines()[-1])
+        best = res["ms"] if best is None else min(best, res["ms"])
+        loaded = res["loaded"]
+    return best, loaded
+
+
+if __name__ == "__main__":
+    ms, loaded = measure()
+    print("import opensitua_http %8.2f ms   heavy modules loaded: %s" % (ms, loaded if loaded else "none"))
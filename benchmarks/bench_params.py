@@ -0,0 +1,36 @@
+# -----------------------------------------------------------------------------
+# Name:        bench_params.py
+# Purpose:     Params vs LazyParams when the handler reads a single key
+#
+#   python benchmarks/bench_params.py
+# -----------------------------------------------------------------------------
+import io
+import timeit
+from opensitua_http.http import Params, LazyParams
+
+QUERY_STRING = "&".join(["key%d=value%d" % (j, j) for j in range(50)]) + "&filename=/data/test.tif"
+HTTP_COOKIE = "; ".join(["cookie%d=%d" % (j, j) for j in range(20)]) + "; __token__=abcdef"
+BODY = ("&".join(["field%d=%s" % (j, "x" * 100) for j in range(50)])).encode("utf-8")
+
+
+def environ(method="GET"):
+    return {
+        "REQUEST_METHOD": method,
+        "QUERY_STRING": QUERY_STRING,
+        "HTTP_COOKIE": HTTP_COOKIE,
+        "DOCUMENT_ROOT": "/var/opengis3",
+        "CONTENT_TYPE": "application/x-www-form-urlencoded",
+        "CONTENT_LENGTH": str(len(BODY)),
+        "wsgi.input": io.BytesIO(BODY),
+    }
+
+
+def bench(cls, method, n=20000):
+    return timeit.timeit(lambda: cls(environ(method)).getvalue("filename"), number=n) / n * 1e6
+
+
+if __name__ == "__main__":
+    for method in ("GET", "POST"):
+        t0 = bench(Params, method)
+        t1 = bench(LazyParams, method)
+        print("%-4s Params %8.2f us   LazyParams %8.2f us   x%.1f" % (method, t0, t1, t0 / t1))
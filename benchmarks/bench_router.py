@@ -0,0 +1,44 @@
+# -----------------------------------------------------------------------------
+# Name:        bench_router.py
+# Purpose:     Router.match time of the first and of the last route added,
+#              with 10 to 10000 routes under the same leading segment
+#
+#   python benchmarks/bench_router.py
+# -----------------------------------------------------------------------------
+import timeit
+from opensitua_http.router import Router
+
+
+def handler(environ, start_response):
+    return []
+
+
+def build(n):
+    """
+    build - n parametric routes sharing the /api prefix, plus their static twins
+    """
+    router = Router()
+    for j in range(n):
+        router.add("/api/layer%d/<id:int>" % j, handler, ["GET"])
+        router.add("/api/layer%d/<id:int>/<name>.json" % j, handler, ["POST"])
+        router.add("/api/static%d" % j, handler)
+    router.compile()
+    return router
+
+
+def measure(router, path, method="GET", number=20000):
+    """
+    measure - microseconds per match
+    """
+    assert router.match(path, method)[0] is not None, path
+    return timeit.timeit(lambda: router.match(path, method), number=number) / number * 1e6
+
+
+if __name__ == "__main__":
+    for n in (10, 100, 1000, 10000):
+        router = build(n)
+        first = measure(router, "/api/layer0/42")
+        last = measure(router, "/api/layer%d/42" % (n - 1))
+        deep = measure(router, "/api/layer%d/42/name.json" % (n - 1), "POST")
+        static = measure(router, "/api/static%d" % (n - 1))
+        print("%6d routes  first %6.2f us   last %6.2f us   last deep %6.2f us   static %6.2f us" % (n * 3, first, last, deep, static))
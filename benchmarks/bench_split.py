@@ -0,0 +1,32 @@
+# -----------------------------------------------------------------------------
+# Name:        bench_split.py
+# Purpose:     split against the char by char implementation on 1KB-1MB
+#              inputs, tests/test_strings.py checks that they agree
+#
+#   python benchmarks/bench_split.py
+# -----------------------------------------------------------------------------
+import timeit
+from opensitua_http.strings import split, _split_legacy
+
+
+def sample(size, sep, glue):
+    """
+    sample - cookie-like text of about size chars
+    """
+    items, length, j = [], 0, 0
+    while length < size:
+        item = "key%d=%s" % (j, "\"quoted%svalue\"" % sep if j % 3 == 0 else "value%d" % j)
+        items.append(item)
+        length += len(item) + len(sep)
+        j += 1
+    return sep.join(items)
+
+
+if __name__ == "__main__":
+    for size in (1024, 10240, 102400, 1048576):
+        for sep, glue in ((",", "\""), ("; ", "\"")):
+            text = sample(size, sep, glue)
+            n = max(1, 200000 // size)
+            t0 = timeit.timeit(lambda: _split_legacy(text, sep, glue), number=n) / n * 1000
+            t1 = timeit.timeit(lambda: split(text, sep, glue), number=n) / n * 1000
+            print("%8d bytes sep=%-4r legacy %10.3f ms   split %10.3f ms   x%.1f" % (size, sep, t0, t1, t0 / t1))
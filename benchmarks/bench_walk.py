@@ -0,0 +1,68 @@
+# -----------------------------------------------------------------------------
+# Name:        bench_walk.py
+# Purpose:     sequential vs parallel ls/listdir/findpath on a synthetic tree
+#              with an injected latency per folder read, as on NFS/SMB mounts
+#
+#   python benchmarks/bench_walk.py [latency_ms] [workers]
+# -----------------------------------------------------------------------------
+import os,sys
+import time
+import shutil
+import tempfile
+import opensitua_http.filesystem as filesystem
+
+
+def make_tree(dirname, depth=4, fanout=4, files=5):
+    """
+    make_tree - fanout folders per level, files in each folder
+    """
+    for j in range(files):
+        open("%s/file%d.%s" % (dirname, j, "tif" if j % 2 else "txt"), "w").close()
+    if depth > 0:
+        for j in range(fanout):
+            subdir = "%s/dir%d" % (dirname, j)
+            os.mkdir(subdir)
+            make_tree(subdir, depth - 1, fanout, files)
+
+
+def with_latency(latency):
+    """
+    with_latency - make every folder read cost latency seconds
+    """
+    scandir = filesystem._scandir
+
+    def slow_scandir(dirname, sort=True):
+        time.sleep(latency)
+        return scandir(dirname, sort)
+    filesystem._scandir = slow_scandir
+    return scandir
+
+
+def bench(func, *args, **kwargs):
+    t0 = time.perf_counter()
+    res = func(*args, **kwargs)
+    return res, (time.perf_counter() - t0) * 1000
+
+
+if __name__ == "__main__":
+    latency = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.002
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    root = tempfile.mkdtemp(prefix="bench_walk")
+    try:
+        make_tree(root)
+        with_latency(latency)
+        cases = [
+            ("ls", filesystem.ls, (root, r'.*\.tif$'), {}),
+            ("listdir", filesystem.listdir, (root,), {}),
+            ("findpath", filesystem.findpath, (root, r'dir3'), {}),
+            ("findpath maxdepth=2", filesystem.findpath, (root, r'dir.*'), {"maxdepth": 2}),
+            ("findpath firstonly", filesystem.findpath, (root, r'dir3'), {"firstonly": True}),
+        ]
+        for name, func, args, kwargs in cases:
+            res0, t0 = bench(func, *args, **kwargs)
+            res1, t1 = bench(func, *args, workers=workers, **kwargs)
+            assert res0 == res1, "%s: parallel results differ" % (name)
+            print("%-20s %6d items   sequential %8.1f ms   workers=%d %8.1f ms   x%.1f" % (
+                name, len(res0), t0, workers, t1, t0 / t1))
+    finally:
+        shutil.rmtree(root)
@@ -26,10 +26,55 @@
 
 __version__ = '0.0.72'
 
+from .cache import *
+from .bundle import *
+from .multipart import *
+from .encoder import *
+from .compress import *
 from .filesystem import *
 from .strings import *
 from .stime import *
 from .http import *
-from .mapfile import *
+from .router import *
+from .timing import *
+from .catalog import *
+from .watcher import *
+
+# mapfile needs GDAL and numpy, asgi needs asyncio: they are imported on
+# first use of one of their names, so the http helpers start without them
+_LAZY_MODULES = {
+    "asgi": ("ASGI_WORKERS", "get_executor", "run_sync", "read_body", "scope_to_environ",
+             "send_response", "call_wsgi", "ASGIApplication", "htmlResponseAsync",
+             "JSONResponseAsync", "httpImageResponseAsync", "MaplayerResponseAsync"),
+    "mapfile": ("GEOMETRY_TYPE", "PixelOf", "safename", "randcolor", "classify",
+                "singlebandgray", "singlebandpseudocolor", "singlebandcustomcolor",
+                "multibandcolor", "SimpleFill", "SimpleLine", "singleSymbol",
+                "categorizedSymbol", "graduatedSymbol", "renderer_v2", "GDAL_MAPLAYER",
+                "MaplayerResponse", "gdal", "gdalconst", "osr", "ogr", "np"),
+}
+_LAZY_NAMES = {name: modname for modname in _LAZY_MODULES for name in _LAZY_MODULES[modname]}
+
+__all__ = [name for name in globals() if not name.startswith("_")] + list(_LAZY_NAMES)
+
+
+def __getattr__(name):
+    """
+    __getattr__ - import the lazy submodule that defines name
+    """
+    import importlib
+    modname = name if name in _LAZY_MODULES else _LAZY_NAMES.get(name)
+    if modname is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    module = importlib.import_module("." + modname, __name__)
+    value = module if name == modname else getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """
+    __dir__ - the lazy names are listed before they are imported
+    """
+    return sorted(set(globals()) | set(_LAZY_NAMES) | set(_LAZY_MODULES))
 
 
@@ -0,0 +1,279 @@
+# -----------------------------------------------------------------------------
+# Licence:
+# Copyright (c) 2012-2019 Luzzi Valerio
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Name:        asgi.py
+# Purpose:     ASGI entry layer over the WSGI response helpers
+#
+# Author:      Luzzi Valerio
+#
+# Created:     17/10/2026
+# -----------------------------------------------------------------------------
+import os,sys
+import asyncio
+import contextvars
+import functools
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .multipart import SPOOL_THRESHOLD, MAX_CONTENT_LENGTH, RequestTooLarge
+from .http import htmlResponse, JSONResponse, httpImageResponse
+
+# GDAL and filesystem work runs in this many threads at most
+ASGI_WORKERS = int(os.environ.get("OPENSITUA_ASGI_WORKERS", "8"))
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    get_executor - the bounded thread pool shared by the async helpers
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ASGI_WORKERS, thread_name_prefix="opensitua_asgi")
+    return _executor
+
+
+async def run_sync(func, *args, **kwargs):
+    """
+    run_sync - run a blocking function in the bounded executor
+    """
+    loop = asyncio.get_running_loop()
+    # keep the context (e.g. the timing spans) of the caller
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+
+async def read_body(receive, max_content_length=MAX_CONTENT_LENGTH):
+    """
+    read_body - collect the request body into a spooled temporary file
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD)
+    size = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        data = message.get("body", b"")
+        size += len(data)
+        if max_content_length and size > max_content_length:
+            body.close()
+            raise RequestTooLarge("request body exceeds %d bytes" % (max_content_length))
+        if data:
+            body.write(data)
+        more_body = message.get("more_body", False)
+    body.seek(0)
+    return body, size
+
+
+def scope_to_environ(scope, body, size=None, extra=None):
+    """
+    scope_to_environ - a WSGI environ from the ASGI http scope
+    """
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/%s" % scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if size is not None:
+        environ["CONTENT_LENGTH"] = str(size)
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name == "CONTENT_LENGTH":
+            environ.setdefault("CONTENT_LENGTH", value)
+        else:
+            key = "HTTP_" + name
+            environ[key] = environ[key] + "," + value if key in environ else value
+    if extra:
+        environ.update(extra)
+    return environ
+
+
+async def send_response(send, status, headers, body):
+    """
+    send_response - send a WSGI status, headers and body iterable through ASGI
+    """
+    await send({
+        "type": "http.response.start",
+        "status": int(status.split(" ", 1)[0]),
+        "headers": [(name.lower().encode("latin-1"), str(value).encode("latin-1")) for name, value in headers],
+    })
+    try:
+        if isinstance(body, (list, tuple)):
+            for data in body:
+                await send({"type": "http.response.body", "body": data, "more_body": True})
+        else:
+            # file iterators read from disk: keep them off the event loop
+            iterator = iter(body)
+            while True:
+                data = await run_sync(next, iterator, None)
+                if data is None:
+                    break
+                await send({"type": "http.response.body", "body": data, "more_body": True})
+    finally:
+        if hasattr(body, "close"):
+            body.close()
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class _Body:
+    """
+    _Body - the chunks already read, then the rest of the WSGI body, closed with it
+    """
+
+    def __init__(self, head, iterator, body):
+        """
+        constructor
+        """
+        self.head = head
+        self.iterator = iterator
+        self.body = body
+
+    def __iter__(self):
+        for data in self.head:
+            yield data
+        for data in self.iterator:
+            yield data
+
+    def close(self):
+        """
+        close
+        """
+        if hasattr(self.body, "close"):
+            self.body.close()
+
+
+async def call_wsgi(handler, environ, send):
+    """
+    call_wsgi - run handler(environ, start_response) in the executor and send its response
+    """
+    response = {"status": "500 Internal Server Error", "headers": []}
+    written = []
+
+    def start_response(status, headers, exc_info=None):
+        response["status"], response["headers"] = status, headers
+        return written.append
+
+    def start(environ):
+        body = handler(environ, start_response)
+        if isinstance(body, (list, tuple)):
+            return written + list(body)
+        # PEP 3333: a generator may call start_response on its first
+        # iteration, the status is known after the first non-empty chunk
+        head, iterator = [], iter(body)
+        try:
+            for data in iterator:
+                head.append(data)
+                if data:
+                    break
+        except BaseException:
+            if hasattr(body, "close"):
+                body.close()
+            raise
+        return _Body(written + head, iterator, body)
+
+    body = await run_sync(start, environ)
+    await send_response(send, response["status"], response["headers"], body)
+
+
+class ASGIApplication:
+    """
+    ASGIApplication - serve a WSGI handler(environ, start_response) from an ASGI server,
+    extra is merged into every environ (e.g. DOCUMENT_ROOT, SCRIPT_FILENAME)
+    """
+
+    def __init__(self, handler, extra=None, max_content_length=MAX_CONTENT_LENGTH):
+        """
+        constructor
+        """
+        self.handler = handler
+        self.extra = extra if extra else {}
+        self.max_content_length = max_content_length
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        try:
+            body, size = await read_body(receive, self.max_content_length)
+        except RequestTooLarge:
+            await send_response(send, "413 Payload Too Large", [("Content-type", "text/html")], [b"413 PAYLOAD TOO LARGE"])
+            return
+        try:
+            environ = scope_to_environ(scope, body, size, self.extra)
+            await call_wsgi(self.handler, environ, send)
+        finally:
+            body.close()
+
+
+async def htmlResponseAsync(environ, send, checkuser=False, conditional=False):
+    """
+    htmlResponseAsync
+    """
+    handler = lambda environ, start_response: htmlResponse(environ, start_response, checkuser, conditional)
+    await call_wsgi(handler, environ, send)
+
+
+async def JSONResponseAsync(obj, send, environ=None, headers=None):
+    """
+    JSONResponseAsync
+    """
+    handler = lambda environ, start_response: JSONResponse(obj, start_response, environ, headers)
+    await call_wsgi(handler, environ, send)
+
+
+async def httpImageResponseAsync(data, send):
+    """
+    httpImageResponseAsync
+    """
+    handler = lambda environ, start_response: httpImageResponse(data, start_response)
+    await call_wsgi(handler, None, send)
+
+
+async def MaplayerResponseAsync(environ, options, send, conditional=False):
+    """
+    MaplayerResponseAsync - the GDAL work runs in the executor
+    """
+    from .mapfile import MaplayerResponse
+    handler = lambda environ, start_response: MaplayerResponse(environ, options, start_response, conditional)
+    await call_wsgi(handler, environ, send)
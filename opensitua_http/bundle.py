@@ -0,0 +1,151 @@
+# -----------------------------------------------------------------------------
+# Licence:
+# Copyright (c) 2012-2019 Luzzi Valerio
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Name:        bundle.py
+# Purpose:     content-hashed js/css bundles
+#
+# Author:      Luzzi Valerio
+#
+# Created:     17/10/2026
+# -----------------------------------------------------------------------------
+import os,re
+import gzip
+import hashlib
+import posixpath
+import tempfile
+from .filesystem import normpath, justpath, justext, mkdirs, isfile
+
+from .compress import accept_encoding, brotli
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+# OPENSITUA_BUNDLE= ""(off) | "on" | "minify"
+BUNDLE_MODE = os.environ.get("OPENSITUA_BUNDLE", "").lower()
+BUNDLE_MAXAGE = 31536000
+
+MIMETYPES = {
+    "js": "application/javascript",
+    "css": "text/css"
+}
+
+def bundledir(DOCUMENT_WWW):
+    """
+    bundledir - the folder of the bundles, None when bundling is off
+    """
+    if BUNDLE_MODE in ("", "0", "off", "false"):
+        return None
+    return normpath(DOCUMENT_WWW + "/lib/bundles")
+
+def minify_css(text):
+    """
+    minify_css - remove comments and collapse the white spaces
+    """
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.DOTALL)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    return text.replace(';}', '}').strip()
+
+def minify_js(text):
+    """
+    minify_js - minify with rjsmin when installed, otherwise leave it as is
+    """
+    return rjsmin.jsmin(text) if rjsmin else text
+
+def rebase_css(text, webname):
+    """
+    rebase_css - make the relative url(...) of a css absolute, so they
+    still resolve once the file is moved into the bundle folder
+    """
+    base = posixpath.dirname(webname)
+
+    def rebase(m):
+        quote, url = m.group(1), m.group(2).strip()
+        if re.match(r'^(/|#|data:|[a-z]+://)', url, re.I):
+            return m.group(0)
+        return "url(%s%s%s)" % (quote, posixpath.normpath(posixpath.join(base, url)), quote)
+
+    return re.sub(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)', rebase, text)
+
+def _atomic_write(data, filename):
+    """
+    _atomic_write - write through a temporary file, concurrent readers never see a partial bundle
+    """
+    fd, tmpname = tempfile.mkstemp(dir=justpath(filename), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as stream:
+            stream.write(data)
+        os.replace(tmpname, filename)
+    except Exception:
+        if os.path.isfile(tmpname):
+            os.remove(tmpname)
+        raise
+
+def bundle(files, type, dirname, minify=False):
+    """
+    bundle - concatenate [(filename, webname),...] into dirname/<hash>.<type>
+    with its .gz and .br siblings, return the bundle filename
+    """
+    texts = []
+    for filename, webname in files:
+        with open(filename, "rb") as stream:
+            text = stream.read().decode("utf-8", "replace")
+        if type == "css":
+            text = rebase_css(text, webname)
+        texts.append(text)
+
+    # a js file may lack the final semicolon
+    text = (";\n" if type == "js" else "\n").join(texts)
+    if minify:
+        text = minify_js(text) if type == "js" else minify_css(text)
+    data = text.encode("utf-8")
+
+    digest = hashlib.md5(data).hexdigest()[:16]
+    filename = normpath("%s/%s.%s" % (dirname, digest, type))
+    if not isfile(filename):
+        mkdirs(dirname)
+        _atomic_write(gzip.compress(data, 9, mtime=0), filename + ".gz")
+        if brotli:
+            _atomic_write(brotli.compress(data), filename + ".br")
+        _atomic_write(data, filename)
+    return filename
+
+def bundleResponse(filename, environ, start_response):
+    """
+    bundleResponse - serve a bundle with immutable cache headers,
+    precompressed when the client accepts it
+    """
+    if not isfile(filename):
+        start_response("404 NOT FOUND", [('Content-type', 'text/html')])
+        return [b"404 NOT FOUND"]
+
+    response_headers = [('Content-type', MIMETYPES.get(justext(filename), 'application/octet-stream')),
+                        ('Cache-Control', 'public, max-age=%d, immutable' % BUNDLE_MAXAGE),
+                        ('Vary', 'Accept-Encoding')]
+    encodings = [encoding for encoding, ext in (("br", ".br"), ("gzip", ".gz")) if isfile(filename + ext)]
+    encoding = accept_encoding(environ, encodings) if encodings else None
+    if encoding:
+        filename += ".br" if encoding == "br" else ".gz"
+        response_headers.append(('Content-Encoding', encoding))
+
+    with open(filename, "rb") as stream:
+        data = stream.read()
+    response_headers.append(('Content-Length', str(len(data))))
+    start_response("200 OK", response_headers)
+    return [data]
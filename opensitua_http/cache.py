@@ -0,0 +1,109 @@
+# -----------------------------------------------------------------------------
+# Licence:
+# Copyright (c) 2012-2019 Luzzi Valerio
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Name:        cache.py
+# Purpose:     process-wide bounded caches
+#
+# Author:      Luzzi Valerio
+#
+# Created:     17/10/2026
+# -----------------------------------------------------------------------------
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    LRUCache - a thread-safe bounded dictionary with hit/miss counters
+    """
+
+    def __init__(self, maxsize=128):
+        """
+        constructor
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.data = OrderedDict()
+        self.lock = threading.RLock()
+
+    def get(self, key, defaultValue=None, check=None):
+        """
+        get - return the cached value and mark it as recently used,
+        check(value) returning False makes the entry count as a miss
+        """
+        with self.lock:
+            if key in self.data and (check is None or check(self.data[key])):
+                self.data.move_to_end(key)
+                self.hits += 1
+                return self.data[key]
+            self.misses += 1
+            return defaultValue
+
+    def set(self, key, value):
+        """
+        set - store value, evicting the least recently used entry if full
+        """
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while self.maxsize and len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+        return value
+
+    def remove(self, key):
+        """
+        remove - drop a single entry
+        """
+        with self.lock:
+            return self.data.pop(key, None)
+
+    def clear(self):
+        """
+        clear - drop all entries and reset counters
+        """
+        with self.lock:
+            self.data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def keys(self):
+        """
+        keys
+        """
+        with self.lock:
+            return list(self.data.keys())
+
+    def items(self):
+        """
+        items - a copy of the (key, value) pairs
+        """
+        with self.lock:
+            return list(self.data.items())
+
+    def info(self):
+        """
+        info - return the cache statistics
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.data), "maxsize": self.maxsize}
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
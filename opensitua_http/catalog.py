@@ -0,0 +1,358 @@
+# -----------------------------------------------------------------------------
+# Licence:
+# Copyright (c) 2012-2019 Luzzi Valerio
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Name:        catalog.py
+# Purpose:     sqlite index of the files under a folder
+#
+# Author:      Luzzi Valerio
+#
+# Created:     17/10/2026
+# -----------------------------------------------------------------------------
+import os
+import stat
+import sqlite3
+import tempfile
+import threading
+from .filesystem import normpath, justfname, juststem, justext, md5text
+from .strings import listify
+
+# the layers GDAL_MAPLAYER can read an extent from
+EXTENT_EXTENSIONS = ("tif", "jpg", "jpeg", "shp", "sqlite", "dxf")
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs(
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime INTEGER
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+CREATE TABLE IF NOT EXISTS files(
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    dir TEXT,
+    name TEXT,
+    stem TEXT,
+    ext TEXT,
+    size INTEGER,
+    mtime INTEGER,
+    inode INTEGER,
+    srs TEXT
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files(dir);
+CREATE INDEX IF NOT EXISTS files_name ON files(name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS files_stem ON files(stem COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS files_ext ON files(ext);
+"""
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def _subtree(pathname):
+    """
+    _subtree - the (lo, hi) range of the paths below pathname
+    """
+    return pathname + "/", pathname + "0"
+
+
+class Catalog:
+    """
+    Catalog - an sqlite index of the files under root with their size, mtime,
+    inode, extension and, with extents=True, the extent and srs read by
+    GDAL_MAPLAYER. rescan() lists again only the folders whose mtime changed,
+    so a file rewritten in place (not replaced) is seen only when its folder changes
+    """
+
+    def __init__(self, root, filedb=None, extents=False):
+        """
+        constructor
+        """
+        self.root = normpath(os.path.abspath(root))
+        self.filedb = filedb if filedb else "%s/opensitua_catalog_%s.sqlite" % (normpath(tempfile.gettempdir()), md5text(self.root))
+        self.extents = extents
+        self.lock = threading.Lock()
+        self.rtree = True
+        self.watching = False
+        self.dirty = set()
+        self.dirty_lock = threading.Lock()
+        self._create()
+
+    def connect(self):
+        """
+        connect - a new connection to the catalog
+        """
+        return sqlite3.connect(self.filedb, timeout=30)
+
+    def _create(self):
+        """
+        _create - the tables, the extents in an R-tree when sqlite has it
+        """
+        conn = self.connect()
+        try:
+            conn.executescript(CATALOG_SCHEMA)
+            try:
+                conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS extents USING rtree(id, minx, maxx, miny, maxy)")
+            except sqlite3.OperationalError:
+                self.rtree = False
+                conn.execute("CREATE TABLE IF NOT EXISTS extents(id INTEGER PRIMARY KEY, minx REAL, maxx REAL, miny REAL, maxy REAL)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _skip(self, filename):
+        """
+        _skip - the catalog itself and its journal when filedb is under root
+        """
+        return filename.startswith(self.filedb)
+
+    def _extent(self, filename, ext):
+        """
+        _extent - ((minx, miny, maxx, maxy), proj4) of a layer, (None, None) otherwise;
+        indexing only reads the layer, it never writes world files or statistics
+        """
+        if not ext in EXTENT_EXTENSIONS:
+            return None, None
+        try:
+            from .mapfile import layer_extent
+            return layer_extent(filename)
+        except Exception:
+            return None, None
+
+    def _index(self, conn, filename, dirname, info, fileid=None):
+        """
+        _index - insert or update one file
+        """
+        size, mtime, inode = info
+        ext = justext(filename).lower()
+        extent, srs = self._extent(filename, ext) if self.extents else (None, None)
+        values = (filename, dirname, justfname(filename), juststem(filename), ext, size, mtime, inode, srs)
+        if fileid:
+            conn.execute("DELETE FROM extents WHERE id=?", (fileid,))
+            conn.execute("UPDATE files SET path=?, dir=?, name=?, stem=?, ext=?, size=?, mtime=?, inode=?, srs=? WHERE id=?",
+                         values + (fileid,))
+        else:
+            fileid = conn.execute("INSERT INTO files(path, dir, name, stem, ext, size, mtime, inode, srs) VALUES(?,?,?,?,?,?,?,?,?)",
+                                  values).lastrowid
+        if extent:
+            minx, miny, maxx, maxy = extent
+            conn.execute("INSERT INTO extents(id, minx, maxx, miny, maxy) VALUES(?,?,?,?,?)", (fileid, minx, maxx, miny, maxy))
+
+    def _forget(self, conn, pathname):
+        """
+        _forget - remove a folder and all its content from the index
+        """
+        lo, hi = _subtree(pathname)
+        where = "dir=? OR (dir>=? AND dir<?)"
+        conn.execute("DELETE FROM extents WHERE id IN (SELECT id FROM files WHERE %s)" % where, (pathname, lo, hi))
+        conn.execute("DELETE FROM files WHERE %s" % where, (pathname, lo, hi))
+        conn.execute("DELETE FROM dirs WHERE path=? OR (path>=? AND path<?)", (pathname, lo, hi))
+
+    def _rescandir(self, conn, pathname, st, res, force=False):
+        """
+        _rescandir - update one folder, returns its subfolders
+        """
+        row = conn.execute("SELECT mtime FROM dirs WHERE path=?", (pathname,)).fetchone()
+        if row and row[0] == st.st_mtime_ns and not force:
+            return [item[0] for item in conn.execute("SELECT path FROM dirs WHERE parent=?", (pathname,))]
+
+        res["listed"] += 1
+        files, subdirs = {}, []
+        try:
+            with os.scandir(pathname) as it:
+                for entry in it:
+                    filename = pathname + "/" + entry.name
+                    try:
+                        if entry.is_dir():
+                            subdirs.append(filename)
+                        elif entry.is_file() and not self._skip(filename):
+                            s = entry.stat()
+                            files[filename] = (s.st_size, s.st_mtime_ns, s.st_ino)
+                    except OSError:
+                        pass
+        except OSError:
+            # Some dir could not be accessible
+            pass
+
+        known = {}
+        for fileid, filename, size, mtime, inode in conn.execute("SELECT id, path, size, mtime, inode FROM files WHERE dir=?", (pathname,)):
+            known[filename] = (fileid, (size, mtime, inode))
+        for filename in known:
+            if not filename in files:
+                conn.execute("DELETE FROM extents WHERE id=?", (known[filename][0],))
+                conn.execute("DELETE FROM files WHERE id=?", (known[filename][0],))
+                res["removed"] += 1
+        for filename in files:
+            if not filename in known:
+                self._index(conn, filename, pathname, files[filename])
+                res["added"] += 1
+            elif known[filename][1] != files[filename]:
+                self._index(conn, filename, pathname, files[filename], known[filename][0])
+                res["updated"] += 1
+
+        for item in conn.execute("SELECT path FROM dirs WHERE parent=?", (pathname,)).fetchall():
+            if not item[0] in subdirs:
+                self._forget(conn, item[0])
+        # the mtime read before listing: a change meanwhile is seen next time
+        conn.execute("INSERT OR REPLACE INTO dirs(path, parent, mtime) VALUES(?,?,?)", (pathname, normpath(os.path.dirname(pathname)), st.st_mtime_ns))
+        return subdirs
+
+    def rescan(self, dirname=None, recursive=True, force=False):
+        """
+        rescan - update the index of dirname (root by default), recursive=False
+        skips its known subfolders, force=True lists dirname even if its
+        mtime did not change
+        """
+        dirname = normpath(os.path.abspath(dirname)) if dirname else self.root
+        res = {"dirs": 0, "listed": 0, "added": 0, "updated": 0, "removed": 0}
+        with self.lock:
+            conn = self.connect()
+            try:
+                visited = set()
+                stack = [(dirname, recursive)]
+                while stack:
+                    pathname, full = stack.pop()
+                    try:
+                        st = os.stat(pathname)
+                    except OSError:
+                        st = None
+                    if st is None or not stat.S_ISDIR(st.st_mode):
+                        self._forget(conn, pathname)
+                        continue
+                    # symbolic links may loop
+                    if (st.st_dev, st.st_ino) in visited:
+                        continue
+                    visited.add((st.st_dev, st.st_ino))
+                    res["dirs"] += 1
+                    subdirs = self._rescandir(conn, pathname, st, res, force and pathname == dirname)
+                    for subdir in subdirs:
+                        # new folders are always read in full
+                        if full or not conn.execute("SELECT 1 FROM dirs WHERE path=?", (subdir,)).fetchone():
+                            stack.append((subdir, True))
+                conn.commit()
+                if res["listed"]:
+                    # the statistics that choose between the name and ext indexes
+                    conn.execute("PRAGMA optimize")
+            finally:
+                conn.close()
+        return res
+
+    def _on_change(self, dirname, name):
+        """
+        _on_change - remember the folders to list again
+        """
+        if dirname is None or dirname == self.root or dirname.startswith(self.root + "/"):
+            with self.dirty_lock:
+                self.dirty.add(dirname)
+
+    def watch(self, watcher=None):
+        """
+        watch - follow the change events of root, update() then lists again
+        only the folders that changed
+        """
+        from .watcher import get_watcher
+        watcher = watcher if watcher else get_watcher(self.root)
+        watcher.subscribe(self._on_change)
+        self.watching = watcher.watch(self.root)
+        if self.watching:
+            # what changed before the events started
+            self.rescan()
+        return self.watching
+
+    def update(self):
+        """
+        update - with watch() list again the folders with change events (also
+        files rewritten in place), otherwise the same as rescan()
+        """
+        if not self.watching:
+            return self.rescan()
+        with self.dirty_lock:
+            dirty, self.dirty = self.dirty, set()
+        if None in dirty:
+            # events were lost
+            return self.rescan()
+        res = {"dirs": 0, "listed": 0, "added": 0, "updated": 0, "removed": 0}
+        for dirname in sorted(dirty):
+            for key, value in self.rescan(dirname, recursive=False, force=True).items():
+                res[key] += value
+        return res
+
+    def find(self, name=None, ext=None, bbox=None, dirname=None):
+        """
+        find - the files by name or stem (case insensitive, * and ? wildcards),
+        by extension ("tif,shp"), intersecting bbox (minx, miny, maxx, maxy)
+        and under dirname
+        """
+        sql, where, args = "SELECT files.path FROM files", [], []
+        if bbox:
+            minx, miny, maxx, maxy = bbox
+            sql += " JOIN extents ON extents.id=files.id"
+            where.append("extents.maxx>=? AND extents.minx<=? AND extents.maxy>=? AND extents.miny<=?")
+            args += [minx, maxx, miny, maxy]
+        if name:
+            if "*" in name or "?" in name:
+                where.append("(lower(files.name) GLOB ? OR lower(files.stem) GLOB ?)")
+                args += [name.lower(), name.lower()]
+            else:
+                where.append("(files.name=? COLLATE NOCASE OR files.stem=? COLLATE NOCASE)")
+                args += [name, name]
+        if ext:
+            exts = [item.lower().lstrip(".") for item in listify(ext)]
+            where.append("files.ext IN (%s)" % ",".join(["?"] * len(exts)))
+            args += exts
+        if dirname:
+            dirname = normpath(os.path.abspath(dirname))
+            lo, hi = _subtree(dirname)
+            where.append("(files.dir=? OR (files.dir>=? AND files.dir<?))")
+            args += [dirname, lo, hi]
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        conn = self.connect()
+        try:
+            # sorted here: ORDER BY would make sqlite walk the path index
+            return sorted([row[0] for row in conn.execute(sql, args)])
+        finally:
+            conn.close()
+
+    def info(self, filename):
+        """
+        info - the indexed record of filename, None if it is not in the catalog
+        """
+        conn = self.connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT files.*, extents.minx, extents.miny, extents.maxx, extents.maxy FROM files "
+                               "LEFT JOIN extents ON extents.id=files.id WHERE files.path=?",
+                               (normpath(os.path.abspath(filename)),)).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+
+def get_catalog(root, filedb=None, extents=False, rescan=False):
+    """
+    get_catalog - the Catalog of root, one per process, scanned when it is
+    first created and with rescan=True
+    """
+    root = normpath(os.path.abspath(root))
+    with _catalogs_lock:
+        created = not root in _catalogs
+        if created:
+            _catalogs[root] = Catalog(root, filedb, extents)
+        catalog = _catalogs[root]
+    if created or rescan:
+        catalog.rescan()
+    return catalog
@@ -0,0 +1,96 @@
+# -----------------------------------------------------------------------------
+# Licence:
+# Copyright (c) 2012-2019 Luzzi Valerio
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Name:        compress.py
+# Purpose:     Accept-Encoding negotiation
+#
+# Author:      Luzzi Valerio
+#
+# Created:     17/10/2026
+# -----------------------------------------------------------------------------
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = 1024    # smaller bodies are sent as they are
+COMPRESS_LEVEL = 6          # gzip level 1-9, brotli quality is scaled to 0-11
+
+
+def accept_encoding(environ, encodings=None):
+    """
+    accept_encoding - the preferred encoding among encodings ("br", "gzip")
+    that the client accepts, None for identity
+    """
+    encodings = encodings if encodings else (("br", "gzip") if brotli else ("gzip",))
+    header = environ.get("HTTP_ACCEPT_ENCODING", "") if environ else ""
+    if not header:
+        return None
+
+    accepted = {}
+    for item in header.split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        name, _, params = item.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+
+    best, bestq = None, 0.0
+    for name in encodings:
+        q = accepted.get(name, accepted.get("*", 0.0))
+        if q > bestq:
+            best, bestq = name, q
+    return best
+
+
+def compress(data, encoding, level=None):
+    """
+    compress - encode data with "gzip" or "br"
+    """
+    level = level if level else COMPRESS_LEVEL
+    if encoding == "br" and brotli:
+        return brotli.compress(data, quality=min(11, int(round(level * 11 / 9.0))))
+    if encoding == "gzip":
+        return gzip.compress(data, level)
+    return data
+
+
+def compress_response(data, environ, response_headers, level=None, min_size=None):
+    """
+    compress_response - compress data for the client, adding Vary and
+    Content-Encoding to response_headers
+    """
+    min_size = COMPRESS_MIN_SIZE if min_size is None else min_size
+    if environ is None or len(data) < min_size:
+        return data
+    response_headers.append(('Vary', 'Accept-Encoding'))
+    encoding = accept_encoding(environ)
+    if encoding:
+        compressed = compress(data, encoding, level)
+        if len(compressed) < len(data):
+            response_headers.append(('Content-Encoding', encoding))
+            return compressed
+    return data
@@ -0,0 +1,114 @@
+# -----------------------------------------------------------------------------
+# Licence:
+# Copyright (c) 2012-2019 Luzzi Valerio
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Name:        encoder.py
+# Purpose:     json encoding straight to bytes
+#
+# Author:      Luzzi Valerio
+#
+# Created:     17/10/2026
+# -----------------------------------------------------------------------------
+import os
+import json
+import math
+import datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_default(obj):
+    """
+    json_default - encode the values the json module does not know:
+    numpy scalars and arrays, sets, bytes and dates
+    """
+    if type(obj).__module__ == "numpy" and hasattr(obj, "tolist"):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode("utf-8", "replace")
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    raise TypeError("Object of type %s is not JSON serializable" % type(obj).__name__)
+
+
+def _finite(obj):
+    """
+    _finite - obj with NaN and Infinity as None, as orjson encodes them
+    """
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    return obj
+
+
+def _json_default_finite(obj):
+    """
+    _json_default_finite - json_default without NaN and Infinity
+    """
+    return _finite(json_default(obj))
+
+
+def _dumps_json(obj):
+    """
+    _dumps_json - the stdlib encoder, NaN and Infinity (e.g. GDAL nodata)
+    become null as with orjson: json.dumps would write the invalid NaN
+    """
+    try:
+        return json.dumps(obj, default=_json_default_finite, allow_nan=False).encode("utf-8")
+    except ValueError as ex:
+        if not str(ex).startswith("Out of range float"):
+            raise
+    return json.dumps(_finite(obj), default=_json_default_finite, allow_nan=False).encode("utf-8")
+
+
+def _dumps_orjson(obj):
+    """
+    _dumps_orjson - the native encoder, numpy arrays are serialized without copies
+    """
+    return orjson.dumps(obj, default=json_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+JSON_ENCODERS = {"json": _dumps_json}
+if orjson:
+    JSON_ENCODERS["orjson"] = _dumps_orjson
+
+# OPENSITUA_JSON_ENCODER=json|orjson, the fastest installed by default
+_json_encoder = JSON_ENCODERS.get(os.environ.get("OPENSITUA_JSON_ENCODER", ""),
+                                  JSON_ENCODERS["orjson"] if orjson else _dumps_json)
+
+
+def set_json_encoder(encoder):
+    """
+    set_json_encoder - select the encoder by name or as a callable obj => bytes
+    """
+    global _json_encoder
+    _json_encoder = JSON_ENCODERS[encoder] if not callable(encoder) else encoder
+    return _json_encoder
+
+
+def json_dumps(obj):
+    """
+    json_dumps - encode obj to utf-8 json bytes
+    """
+    return _json_encoder(obj)
@@ -26,8 +26,13 @@ import shutil,glob
 import datetime
 import hashlib
 import base64
+import mmap
+import contextlib
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from .strings import listify,tempname,sformat
+from .cache import LRUCache
 from .stime import strftime
 
 def isfile(pathname):
@@ -120,18 +125,125 @@ def name_without_ext(filename):
     return re.sub(r'\.(\w)+$', '', filename, 1, re.I)
 
 
-def strtofile(text, filename, append=False):
+# skipIdentical compares the files in blocks of this size
+COMPARE_BLOCK_SIZE = 64*1024
+
+
+def _chunks(text):
+    """
+    _chunks - text (str, bytes or an iterable of them, e.g. a FileUpload) as bytes chunks
+    """
+    if not text:
+        return []
+    if isinstance(text, (bytes, bytearray, memoryview)):
+        return [text]
+    if isinstance(text, str):
+        return [text.encode('utf-8')]
+    return (chunk.encode('utf-8') if isinstance(chunk, str) else chunk for chunk in text)
+
+
+def _samecontent(filename, chunks, size):
+    """
+    _samecontent - True if filename holds exactly the size bytes of chunks
+    """
+    try:
+        if os.stat(filename).st_size != size:
+            return False
+        with open(filename, "rb") as stream:
+            for chunk in chunks:
+                view = memoryview(chunk).cast("B")
+                while len(view):
+                    block = stream.read(min(len(view), COMPARE_BLOCK_SIZE))
+                    if not block or view[:len(block)] != block:
+                        return False
+                    view = view[len(block):]
+            return not stream.read(1)
+    except OSError:
+        return False
+
+
+def _fsyncdir(dirname):
+    """
+    _fsyncdir - make a rename in dirname durable, where the system allows it
+    """
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(dirname, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _replacefile(chunks, filename, fsync=False, skipIdentical=False):
+    """
+    _replacefile - write chunks to a temporary file next to filename and move it
+    over filename: readers see the old or the new file, never a part of it
+    """
+    dirname = justpath(filename) or "."
+    while True:
+        tmpname = "%s/.%s.%s.tmp" % (dirname, justfname(filename), os.urandom(4).hex())
+        try:
+            # 0o666 and the umask, like open(filename, "wb")
+            fd = os.open(tmpname, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+            break
+        except FileExistsError:
+            continue
+    try:
+        with os.fdopen(fd, "wb") as stream:
+            for chunk in chunks:
+                stream.write(chunk)
+            stream.flush()
+            if fsync:
+                os.fsync(stream.fileno())
+        if skipIdentical:
+            with open(tmpname, "rb") as stream:
+                blocks = iter(lambda: stream.read(COMPARE_BLOCK_SIZE), b"")
+                if _samecontent(filename, blocks, os.path.getsize(tmpname)):
+                    os.remove(tmpname)
+                    return False
+        try:
+            os.chmod(tmpname, os.stat(filename).st_mode & 0o7777)
+        except OSError:
+            pass
+        os.replace(tmpname, filename)
+        if fsync:
+            _fsyncdir(dirname)
+        return True
+    except BaseException:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+
+def strtofile(text, filename, append=False, atomic=False, fsync=False, skipIdentical=False):
     """
-    strtofile
+    strtofile - text is a str, bytes or an iterable of chunks written as they come,
+    atomic=True replaces filename at once with a temporary file of the same folder,
+    fsync=True flushes the content to disk, skipIdentical=True leaves filename
+    (and its mtime) untouched when it already holds the same content
     """
     try:
-        flag = "ab" if append else "wb"
         mkdirs(justpath(filename))
-        with open(filename, flag) as stream:
-            if text:
-                if isinstance(text, str):
-                    text = text.encode('utf-8')
-                stream.write(text)
+        chunks = _chunks(text)
+        if append:
+            with open(filename, "ab") as stream:
+                for chunk in chunks:
+                    stream.write(chunk)
+                if fsync:
+                    stream.flush()
+                    os.fsync(stream.fileno())
+        elif skipIdentical and isinstance(chunks, list) and _samecontent(filename, chunks, sum(memoryview(chunk).nbytes for chunk in chunks)):
+            pass
+        elif atomic or skipIdentical:
+            # an iterable is compared once it is on disk, hence through the temporary file
+            _replacefile(chunks, filename, fsync, skipIdentical)
+        else:
+            with open(filename, "wb") as stream:
+                for chunk in chunks:
+                    stream.write(chunk)
+                if fsync:
+                    stream.flush()
+                    os.fsync(stream.fileno())
     except Exception as ex:
         print(ex)
         return ""
@@ -197,7 +309,7 @@ def rename(filesrc, filedest, overwrite=True):
     rename
     """
     try:
-        if file(filedest) and overwrite:
+        if isfile(filedest) and overwrite:
             remove(filedest)
         mkdirs(justpath(filedest))
         os.rename(filesrc, filedest)
@@ -269,106 +381,292 @@ def chdir(pathname):
     return False
 
 
-def ls(dirname=".", filter=r'.*', recursive=True, exclude=""):
+def _scandir(dirname, sort=True):
     """
-    ls - list all files in dirname
+    _scandir - [(name, isfile, isdir), ...] of dirname sorted by name,
+    [] if it could not be read
+    """
+    try:
+        with os.scandir(dirname) as it:
+            entries = [(entry.name, entry.is_file(), entry.is_dir()) for entry in it]
+    except OSError:
+        # Some dir could not be accessible
+        return []
+    if sort:
+        entries.sort()
+    return entries
+
+
+def _matcher(filter):
+    """
+    _matcher - the match function of filter, compiled once
+    """
+    return filter.match if hasattr(filter, "match") else re.compile(filter, re.IGNORECASE).match
+
+
+class _DirReader:
+    """
+    _DirReader - reads the folders of a walk. With workers > 0 each folder
+    read also starts reading its subfolders in a bounded thread pool, the
+    walk takes the results in its own order so they do not depend on timing
+    """
+
+    def __init__(self, read, children, workers=0, maxdepth=-1, maxpending=None):
+        """
+        constructor
+        """
+        self.read = read
+        self.children = children
+        self.maxdepth = maxdepth
+        self.maxpending = maxpending if maxpending else 16 * workers
+        self.pending = {}
+        self.queue = []
+        self.taken = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="opensitua_walk") if workers > 0 else None
+
+    def _submit(self, dirname, depth):
+        """
+        _submit - start reading dirname if a slot is free, called with the lock
+        """
+        if self.executor and len(self.pending) < self.maxpending and (self.maxdepth < 0 or depth < self.maxdepth):
+            if not dirname in self.pending and not dirname in self.taken:
+                self.pending[dirname] = self.executor.submit(self._readahead, dirname, depth)
+
+    def _readahead(self, dirname, depth):
+        """
+        _readahead - read dirname in a worker and go on with its subfolders
+        """
+        entries = self.read(dirname)
+        with self.lock:
+            for child in self.children(dirname, entries):
+                self._submit(child, depth + 1)
+        return entries
+
+    def get(self, dirname, depth=0):
+        """
+        get - the entries of dirname, read ahead or now
+        """
+        if not self.executor:
+            return self.read(dirname)
+        with self.lock:
+            self.taken.add(dirname)
+            future = self.pending.pop(dirname, None)
+        entries = future.result() if future else self.read(dirname)
+        with self.lock:
+            # a stack: the subfolders of the last folder read come next in the walk
+            self.queue.extend(reversed([(child, depth + 1) for child in self.children(dirname, entries)]))
+            while self.queue and len(self.pending) < self.maxpending:
+                self._submit(*self.queue.pop())
+        return entries
+
+    def close(self):
+        """
+        close - drop the reads nobody will consume
+        """
+        with self.lock:
+            if self.executor:
+                for future in self.pending.values():
+                    future.cancel()
+                self.executor.shutdown(wait=False)
+            self.executor = None
+            self.pending, self.queue = {}, []
+
+
+def iterls(dirname=".", filter=r'.*', recursive=True, exclude="", workers=0):
+    """
+    iterls - generate the files in dirname in the order of ls
     """
-    res = []
     dirname = normpath(dirname)
-    if os.path.isdir(dirname):
-        try:
-            # Some dir could not be accessible
-            filenames = os.listdir(dirname)
-            filenames.sort()
-        except:
-            filenames = []
+    if not os.path.isdir(dirname):
+        return
+    match = _matcher(filter)
+    exclude = exclude.lower() if exclude else ""
+    children = lambda dirname, entries: [normpath(dirname + "/" + name) for name, _, isdir in entries if isdir] if recursive else []
+    reader = _DirReader(_scandir, children, workers)
+    try:
+        # depth first, the content of a folder comes in its place among the files
+        stack = [(dirname, iter(reader.get(dirname)))]
+        while stack:
+            dirname, entries = stack[-1]
+            item = next(entries, None)
+            if item is None:
+                stack.pop()
+                continue
+            name, isfile, isdir = item
+            filename = dirname + "/" + name
+            if isfile and match(filename):
+                if not exclude or not exclude in filename.lower():
+                    yield filename
+            if isdir and recursive:
+                filename = normpath(filename)
+                stack.append((filename, iter(reader.get(filename))))
+    finally:
+        reader.close()
 
-        for filename in filenames:
-            filename = dirname + "/" + filename
-            if os.path.isfile(filename) and re.match(filter, filename, re.IGNORECASE):
 
-                if (not exclude) or (exclude and not (exclude.lower() in filename.lower())):
-                    text = "%s" % (filename)
-                    res += [text]
+def ls(dirname=".", filter=r'.*', recursive=True, exclude="", workers=0):
+    """
+    ls - list all files in dirname, workers > 0 reads the folders in parallel
+    """
+    return list(iterls(dirname, filter, recursive, exclude, workers))
 
-            if os.path.isdir(filename) and recursive:
-                res += ls(filename, filter, True, exclude)
 
-    return res
+def _sortdirs(dirname, items, sortby):
+    """
+    _sortdirs - the entries of dirname in the order of sortby
+    """
+    if sortby == "name":
+        items.sort()
+    elif sortby == "ctime":
+        items.sort(key=lambda item: filectime(dirname + "/" + item[0]))
+    return items
 
 
-def listdir(dirname=".", filter=r'.*', recursive=True, sortby="name"):
+def _listdirs(dirname, sortby):
     """
-    listdir - list all directoriesin dirname
+    _listdirs - the entries of dirname for listdir
+    """
+    try:
+        return _sortdirs(dirname, _scandir(dirname, False), sortby)
+    except Exception as ex:
+        print(ex)
+        return []
+
+
+def iterlistdir(dirname=".", filter=r'.*', recursive=True, sortby="name", workers=0):
+    """
+    iterlistdir - generate the directories in dirname in the order of listdir
     """
-    res = []
     dirname = normpath(dirname)
-    if os.path.isdir(dirname):
-        try:
-            # Some dir could not be accessible
-            items = os.listdir(dirname)
-            if  sortby=="name":
-                items.sort()
-            elif sortby=="ctime":
-                items = [{"name":item,"ctime":filectime(dirname+"/"+item)} for item in items]
-                items.sort(key=lambda k:k["ctime"])
-                items = [item["name"] for item in items]
-        except Exception as ex:
-            print(ex)
-            items = []
-        for item in items:
-            item = dirname + "/" + item
-            if os.path.isdir(item) and re.match(filter, item, re.IGNORECASE):
-                res += ["%s" % (item)]
+    if not os.path.isdir(dirname):
+        return
+    match = _matcher(filter)
+    children = lambda dirname, items: [normpath(dirname + "/" + name) for name, _, isdir in items
+                                       if isdir and match(dirname + "/" + name)] if recursive else []
+    reader = _DirReader(lambda dirname: _listdirs(dirname, sortby), children, workers)
+    try:
+        stack = [(dirname, iter(reader.get(dirname)))]
+        while stack:
+            dirname, items = stack[-1]
+            item = next(items, None)
+            if item is None:
+                stack.pop()
+                continue
+            name, _, isdir = item
+            pathname = dirname + "/" + name
+            if isdir and match(pathname):
+                yield pathname
                 if recursive:
-                    res += listdir(item, filter=filter, recursive=True, sortby=sortby)
-    return res
+                    pathname = normpath(pathname)
+                    stack.append((pathname, iter(reader.get(pathname))))
+    finally:
+        reader.close()
 
 
-def findpath(searchdir=".", filter=r".*", maxdepth=-1, firstonly=False):
+def listdir(dirname=".", filter=r'.*', recursive=True, sortby="name", workers=0):
     """
-    findpath
+    listdir - list all directoriesin dirname, workers > 0 reads the folders in parallel
     """
-    res = []
+    return list(iterlistdir(dirname, filter, recursive, sortby, workers))
 
-    # Limit depth search
-    if maxdepth == 0:
-        return res
 
+def iterfindpath(searchdir=".", filter=r".*", maxdepth=-1, workers=0):
+    """
+    iterfindpath - generate the directories whose name matches filter,
+    for each folder its matching subfolders first, then their content
+    """
+    match = _matcher(filter)
+    children = lambda searchdir, entries: [os.path.join(searchdir, name) for name, _, isdir in entries if isdir]
+    reader = _DirReader(_scandir, children, workers, maxdepth)
     try:
-        items = os.listdir(searchdir)
-        for item in items:
-            pathname = os.path.join(searchdir, item)
-            if os.path.isdir(pathname):
-                if re.match(filter, item, re.IGNORECASE):
-                    if firstonly:
-                        return [pathname]
-                    res.append(pathname)
-        # Recursion
-        for item in items:
-            pathname = os.path.join(searchdir, item)
-            if os.path.isdir(pathname):
-                results = findpath(pathname, filter, maxdepth - 1, firstonly)
-                if len(results) and firstonly:
-                    return results[0]
-                res += results
-    except Exception:
-        # print ex
-        pass
+        stack = [(searchdir, 0)]
+        while stack:
+            searchdir, depth = stack.pop()
+            # Limit depth search
+            if maxdepth >= 0 and depth >= maxdepth:
+                continue
+            subdirs = [name for name, _, isdir in reader.get(searchdir, depth) if isdir]
+            for name in subdirs:
+                if match(name):
+                    yield os.path.join(searchdir, name)
+            for name in reversed(subdirs):
+                stack.append((os.path.join(searchdir, name), depth + 1))
+    finally:
+        reader.close()
+
+
+def findpath(searchdir=".", filter=r".*", maxdepth=-1, firstonly=False, workers=0):
+    """
+    findpath - workers > 0 reads the folders in parallel
+    """
+    res = []
+    for pathname in iterfindpath(searchdir, filter, maxdepth, workers):
+        res.append(pathname)
+        if firstonly:
+            break
     return res
 
 
 
+B64_CHUNK_SIZE = 3 * 64 * 1024
+
+@contextlib.contextmanager
+def mmapfile(filename):
+    """
+    mmapfile - with mmapfile(filename) as data: a read-only bytes-like
+    mapping of the file, the pages are read by the os only when used
+    """
+    with open(filename, "rb") as stream:
+        if os.fstat(stream.fileno()).st_size == 0:
+            # an empty file cannot be mapped
+            yield b""
+            return
+        data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield data
+    finally:
+        data.close()
+
+def iterlines(filename, encoding=None):
+    """
+    iterlines - the lines of filename, as filetoarray but one at a time
+    """
+    try:
+        with open(filename, "r", encoding=encoding) as stream:
+            for line in stream:
+                yield line
+    except OSError:
+        return
+
+def iterb64(filename, chunksize=B64_CHUNK_SIZE):
+    """
+    iterb64 - the base64 of filename in bytes chunks, their concatenation is
+    the base64 of the whole file (chunksize is rounded to a multiple of 3)
+    """
+    chunksize = max(3, chunksize - chunksize % 3)
+    buffer = bytearray(chunksize)
+    view = memoryview(buffer)
+    with open(filename, "rb") as stream:
+        n = stream.readinto(buffer)
+        while n:
+            # a short read in the middle would break the 3 bytes alignment
+            while n < chunksize:
+                m = stream.readinto(view[n:])
+                if not m:
+                    break
+                n += m
+            yield base64.standard_b64encode(view[:n])
+            n = stream.readinto(buffer)
+
 def b64(filename):
     """
     b64
     """
-    if file(filename):
-        with open(filename, 'rb') as stream:
-            data = stream.read()
-    else:
-        data = b''
-    return base64.standard_b64encode(data).decode('utf-8')
+    if isfile(filename):
+        with mmapfile(filename) as data:
+            return base64.standard_b64encode(data).decode('utf-8')
+    return base64.standard_b64encode(b'').decode('utf-8')
 
 def md5text(text):
     """
@@ -379,3 +677,66 @@ def md5text(text):
         hash.update(text.encode("utf-8"))
         return hash.hexdigest()
     return None
+
+
+#-- file digests, cached while the file keeps its device, inode, size and mtime
+DIGEST_BUFFER_SIZE = 1024 * 1024
+DIGEST_CACHE_SIZE = 4096
+_digests = LRUCache(DIGEST_CACHE_SIZE)
+
+def _filekey(st, algorithm):
+    """
+    _filekey - the cache key of a file version
+    """
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, algorithm)
+
+def filedigest(filename, algorithm="md5", bufsize=DIGEST_BUFFER_SIZE):
+    """
+    filedigest - the hex digest ("md5", "sha256", "blake2b", ...) of the file,
+    read in bufsize blocks into one reused buffer; None if it cannot be read
+    """
+    try:
+        key = _filekey(os.stat(filename), algorithm)
+        digest = _digests.get(key)
+        if digest:
+            return digest
+        hash = hashlib.new(algorithm)
+        buffer = bytearray(bufsize)
+        view = memoryview(buffer)
+        with open(filename, "rb") as stream:
+            key = _filekey(os.fstat(stream.fileno()), algorithm)
+            n = stream.readinto(buffer)
+            while n:
+                hash.update(view[:n])
+                n = stream.readinto(buffer)
+            changed = _filekey(os.fstat(stream.fileno()), algorithm) != key
+    except OSError:
+        return None
+    digest = hash.hexdigest()
+    if not changed:
+        # a file written while it was read is hashed again next time
+        _digests.set(key, digest)
+    return digest
+
+def filedigests(filenames, algorithm="md5", workers=4, bufsize=DIGEST_BUFFER_SIZE):
+    """
+    filedigests - {filename: digest} of the files, hashed in parallel
+    """
+    filenames = listify(filenames)
+    if workers <= 1 or len(filenames) <= 1:
+        return {filename: filedigest(filename, algorithm, bufsize) for filename in filenames}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="opensitua_digest") as executor:
+        digests = executor.map(lambda filename: filedigest(filename, algorithm, bufsize), filenames)
+        return dict(zip(filenames, digests))
+
+def digest_cache_info():
+    """
+    digest_cache_info - hit/miss statistics of the digest cache
+    """
+    return _digests.info()
+
+def invalidate_digest_cache():
+    """
+    invalidate_digest_cache
+    """
+    _digests.clear()
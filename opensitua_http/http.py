@@ -24,21 +24,36 @@
 # -----------------------------------------------------------------------------
 from .filesystem import *
 from .strings import *
-from jinja2 import Environment, FileSystemLoader
-import os,sys,math,re
-import json,base64
-from cgi import FieldStorage, parse_qs, escape
-from builtins import str as unicode
+from .cache import LRUCache
+from .bundle import BUNDLE_MODE, bundle, bundledir as get_bundledir
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+import os,sys,math,re,time
+import threading
+import logging
+import stat,mimetypes
+import base64
+from .encoder import json_dumps
+from .timing import span, timed
+from .compress import compress_response, accept_encoding
+from .multipart import parse_form, SPOOL_THRESHOLD, MAX_CONTENT_LENGTH
+from .watcher import WATCH_ENABLED, get_watcher, is_watched
+from urllib.parse import parse_qs
+from html import escape
 import sqlite3
+from urllib.request import pathname2url
+from email.utils import formatdate, parsedate_to_datetime
+
+logger = logging.getLogger("opensitua_http")
 
 class Params:
     """
     Params
     """
 
-    def __init__(self, environ):
+    def __init__(self, environ, spool_threshold=SPOOL_THRESHOLD, max_content_length=MAX_CONTENT_LENGTH):
         """
-        constructor
+        constructor - uploaded files bigger than spool_threshold are kept
+        in temporary files, bodies bigger than max_content_length raise RequestTooLarge
         """
         self.q = {}
         if isinstance(environ, (dict,)) and not "REQUEST_METHOD" in environ:
@@ -48,22 +63,19 @@ class Params:
             request_body = environ['QUERY_STRING']
             q = parse_qs(request_body)
             for key in q:
-                self.q[key] = [escape(item) for item in q[key]]
+                self.q[key] = [escape(item, quote=False) for item in q[key]]
 
         elif environ and "REQUEST_METHOD" in environ and environ["REQUEST_METHOD"] == "POST":
 
-            env_copy = environ.copy()
-            env_copy['QUERY_STRING'] = ''
-            q = FieldStorage(fp=environ["wsgi.input"], environ=env_copy, keep_blank_values=True)
+            q = parse_form(environ, spool_threshold, max_content_length)
             for key in q:
-                self.q[key] = q.getvalue(key)
-                # print(key, "=", len(q.getvalue(key)))
+                self.q[key] = q[key][0] if len(q[key]) == 1 else q[key]
 
             # load extra query string info:
             request_body = environ['QUERY_STRING']
             q = parse_qs(request_body)
             for key in q:
-                self.q[key] = [escape(item) for item in q[key]]
+                self.q[key] = [escape(item, quote=False) for item in q[key]]
 
         if environ and "DOCUMENT_ROOT" in environ:
             self.q["DOCUMENT_ROOT"] = environ["DOCUMENT_ROOT"]
@@ -124,6 +136,133 @@ class Params:
             params[key] = self.get(key)
         return params
 
+class LazyParams:
+    """
+    LazyParams - same interface of Params, but the query string, the body
+    and the cookies are parsed only the first time a key is looked up
+    """
+    __slots__ = ("environ", "spool_threshold", "max_content_length", "_plain", "_query", "_body", "_cookies", "_q")
+
+    def __init__(self, environ, spool_threshold=SPOOL_THRESHOLD, max_content_length=MAX_CONTENT_LENGTH):
+        """
+        constructor
+        """
+        self.environ = environ if environ else {}
+        self.spool_threshold = spool_threshold
+        self.max_content_length = max_content_length
+        self._plain = isinstance(environ, (dict,)) and not "REQUEST_METHOD" in environ
+        self._query = None
+        self._body = None
+        self._cookies = None
+        self._q = None
+        if "DOCUMENT_ROOT" in self.environ:
+            self.environ["DOCUMENT_WWW"] = os.path.abspath(self.environ["DOCUMENT_ROOT"] + "/var/www")
+
+    def _method(self):
+        return self.environ["REQUEST_METHOD"] if "REQUEST_METHOD" in self.environ else None
+
+    def query(self):
+        """
+        query - the escaped query string values
+        """
+        if self._query is None:
+            self._query = {}
+            if self._method() in ("GET", "POST"):
+                q = parse_qs(self.environ['QUERY_STRING'] if 'QUERY_STRING' in self.environ else "")
+                for key in q:
+                    self._query[key] = [escape(item, quote=False) for item in q[key]]
+        return self._query
+
+    def body(self):
+        """
+        body - the POST form values
+        """
+        if self._body is None:
+            self._body = {}
+            if self._method() == "POST":
+                q = parse_form(self.environ, self.spool_threshold, self.max_content_length)
+                for key in q:
+                    self._body[key] = q[key][0] if len(q[key]) == 1 else q[key]
+        return self._body
+
+    def cookies(self):
+        """
+        cookies
+        """
+        if self._cookies is None:
+            HTTP_COOKIE = self.environ["HTTP_COOKIE"] if "HTTP_COOKIE" in self.environ else {}
+            self._cookies = mapify(HTTP_COOKIE, ";") if isinstance(HTTP_COOKIE, (str,)) else HTTP_COOKIE
+        return self._cookies
+
+    def _lookup(self, key):
+        """
+        _lookup - (True, value) with the same precedence of Params, (False, None) if missing;
+        the values are never base64 decoded: with encoded=true Params walks the
+        query string values, which are lists, and b64decode leaves them as they are
+        """
+        if key == "HTTP_COOKIE" and key in self.environ:
+            return True, self.cookies()
+        if self._plain:
+            return (True, self.environ[key]) if key in self.environ else (False, None)
+        if key in ("DOCUMENT_ROOT", "DOCUMENT_WWW") and key in self.environ:
+            return True, self.environ[key]
+        query = self.query()
+        if key in query:
+            return True, query[key]
+        body = self.body()
+        if key in body:
+            return True, body[key]
+        return False, None
+
+    def keys(self):
+        """
+        keys
+        """
+        return self.toObject().keys()
+
+    def getvalue(self, key, defaultValue=None):
+        """
+        getvalue
+        """
+        found, value = self._lookup(key)
+        if not found:
+            return defaultValue
+        if isinstance(value, (tuple, list)) and len(value) > 0:
+            return value[0]
+        return value
+
+    def get(self, key, defaultValue=None):
+        """
+        get
+        """
+        found, value = self._lookup(key)
+        if not found:
+            return defaultValue
+        if isinstance(value, (tuple, list)) and len(value) == 1:
+            return value[0]
+        return value
+
+    def toObject(self):
+        if self._plain:
+            if self._q is None:
+                self._q = dict(self.environ)
+                if "HTTP_COOKIE" in self._q:
+                    self._q["HTTP_COOKIE"] = self.cookies()
+            return self._q
+        if self._q is None:
+            names = list(self.body().keys()) + list(self.query().keys())
+            names += [key for key in ("DOCUMENT_ROOT", "DOCUMENT_WWW", "HTTP_COOKIE") if key in self.environ]
+            self._q = {}
+            for key in names:
+                self._q[key] = self._lookup(key)[1]
+        return self._q
+
+    def toDictionary(self):
+        params = {}
+        for key in self.keys():
+            params[key] = self.get(key)
+        return params
+
 def webpath(filename, pivot ):
     """
     webpath -  pivot = "/apps/"
@@ -131,13 +270,147 @@ def webpath(filename, pivot ):
     return "/" + rightpart(normpath(filename), pivot)
 
 
-def loadlibs(dirnames, type, version):
+#-- generated asset tags, reused until one of the scanned directories changes
+ASSET_CACHE_SIZE = 256
+_assets = LRUCache(ASSET_CACHE_SIZE)
+_asset_scans = {"count": 0, "seconds": 0.0, "last": 0.0}
+
+def _dirmtimes(dirnames):
     """
-    loadlibs
+    _dirmtimes - mtime of each directory (and subdirectory) in dirnames
+    """
+    res = {}
+    for dirname in dirnames:
+        dirname = normpath(dirname)
+        try:
+            res[dirname] = os.stat(dirname).st_mtime_ns
+        except OSError:
+            res[dirname] = None
+            continue
+        for root, dirs, _ in os.walk(dirname):
+            for item in dirs:
+                pathname = normpath(root + "/" + item)
+                try:
+                    res[pathname] = os.stat(pathname).st_mtime_ns
+                except OSError:
+                    res[pathname] = None
+    return res
+
+def _unchanged(mtimes):
+    """
+    _unchanged - True if none of the directories changed since the scan
+    """
+    for dirname in mtimes:
+        try:
+            if os.stat(dirname).st_mtime_ns != mtimes[dirname]:
+                return False
+        except OSError:
+            if mtimes[dirname] is not None:
+                return False
+    return True
+
+def _filestats(filenames):
+    """
+    _filestats - (filename, size, mtime_ns) of each file
+    """
+    res = []
+    for filename in filenames:
+        try:
+            st = os.stat(filename)
+            res.append((filename, st.st_size, st.st_mtime_ns))
+        except OSError:
+            res.append((filename, None, None))
+    return tuple(res)
+
+def _cached_assets(key, dirnames, scan):
+    """
+    _cached_assets - memoize scan() until one of the dirnames changes,
+    scan() returns the text and the files whose content it holds (bundles),
+    these are checked by size and mtime since an edit in place does not
+    change the directory mtimes; watched dirnames are not checked: their
+    entries are dropped on events
+    """
+    roots = tuple([normpath(dirname) for dirname in dirnames])
+    watched = all([is_watched(root) for root in roots])
+    check = lambda item: item[3] if watched else _unchanged(item[0]) and _filestats([f for (f, _, _) in item[5]]) == item[5]
+    item = _assets.get(key, check=check)
+    if item:
+        return item[1]
+    generation = _watch_events["count"]
+    t0 = time.time()
+    mtimes = _dirmtimes(dirnames)
+    text, sources = scan()
+    stats = _filestats(sources)
+    seconds = time.time() - t0
+    _asset_scans["count"] += 1
+    _asset_scans["seconds"] += seconds
+    _asset_scans["last"] = seconds
+    # a change during the scan may have been missed: keep checking this entry
+    watched = watched and generation == _watch_events["count"]
+    _assets.set(key, (mtimes, text, seconds, watched, roots, stats))
+    return text
+
+def asset_cache_info():
+    """
+    asset_cache_info - hit/miss statistics and time spent scanning the asset folders
+    """
+    res = _assets.info()
+    res["scans"] = _asset_scans["count"]
+    res["scan_seconds"] = _asset_scans["seconds"]
+    res["last_scan_seconds"] = _asset_scans["last"]
+    res["entries"] = {key: item[2] for key, item in _assets.data.items()}
+    return res
+
+def invalidate_asset_cache():
+    """
+    invalidate_asset_cache
+    """
+    _assets.clear()
+
+def _tag(filename, type):
+    """
+    _tag - the <script> or <link> tag of a js/css file
+    """
+    if type == "js":
+        return sformat("<script type='text/javascript' src='{filename}'></script>\n", {"filename": filename})
+    return sformat("<link href='{filename}' rel='stylesheet' type='text/css'/>\n", {"filename": filename})
+
+def _tags(files, version, bundledir=None, minify=False):
+    """
+    _tags - the tags of files [(filename, webname, type),...] and the files
+    whose content they depend on: the bundled ones, none without bundles,
+    whose tags keep ?v=version (also ?v=None without version.txt, as always)
+    """
+    if bundledir:
+        return _bundletags(files, bundledir, minify), [filename for (filename, _, _) in files]
+    return "".join([_tag("%s?v=%s" % (webname, version), type) for (_, webname, type) in files]), []
+
+def _bundletags(files, bundledir, minify):
+    """
+    _bundletags - one tag per type for the bundle of files [(filename, webname, type),...]
     """
     text = ""
+    for type in ("js", "css"):
+        items = [(filename, webname) for (filename, webname, t) in files if t == type]
+        if items:
+            filename = bundle(items, type, bundledir, minify)
+            # the name changes with the content, no need of ?v=
+            text += _tag("/lib/" + rightpart(filename, "/lib/"), type)
+    return text
+
+def loadlibs(dirnames, type, version, bundledir=None, minify=False):
+    """
+    loadlibs
+    """
     dirnames = listify(dirnames, sep=",")
+    key = ("loadlibs", tuple(dirnames), type, version, bundledir, minify)
+    return _cached_assets(key, dirnames, lambda: _loadlibs(dirnames, type, version, bundledir, minify))
 
+def _loadlibs(dirnames, type, version, bundledir=None, minify=False):
+    """
+    _loadlibs - scan the folders and generate the tags
+    """
+    files = []
     for dirname in dirnames:
         filenames = ls(dirname, r'.*\.%s$'%(type), recursive=True)
         for filename in filenames:
@@ -147,23 +420,31 @@ def loadlibs(dirnames, type, version):
                 webname = "/webgis/"+ rightpart(filename, "/webgis/")
             else:
                 webname = "/lib/" + rightpart(filename, "/lib/")
-            if webname and webname != '/lib/':
-                if   type=="js":
-                    text += sformat("<script type='text/javascript' src='{filename}?v={version}'></script>\n", {"filename": webname,"version":version});
-                elif type=="css":
-                    text += sformat("<link href='{filename}?v={version}' rel='stylesheet' type='text/css'/>\n",{"filename": webname,"version":version});
+            if bundledir and filename.startswith(bundledir + "/"):
+                continue
+            if webname and webname != '/lib/' and type in ("js", "css"):
+                files.append((filename, webname, type))
 
-    return text
+    return _tags(files, version, bundledir, minify)
 
 def load(dirname, environ):
     """
     load
     """
-    text = ""
     DOCUMENT_ROOT = environ['DOCUMENT_ROOT']
     DOCUMENT_WWW  = DOCUMENT_ROOT + "/var/www"
     dirname = DOCUMENT_WWW +"/"+ dirname
     version = environ["__version__"]
+    bundledir = environ["__bundledir__"] if "__bundledir__" in environ else None
+    minify = BUNDLE_MODE == "minify"
+    key = ("load", dirname, version, bundledir, minify)
+    return _cached_assets(key, [dirname], lambda: _load(dirname, version, bundledir, minify))
+
+def _load(dirname, version, bundledir=None, minify=False):
+    """
+    _load - scan the folder and generate the tags
+    """
+    files = []
     filenames = ls(dirname, r'.*\.(js|css)$', recursive=True)
     for filename in filenames:
         #common libraries
@@ -174,43 +455,184 @@ def load(dirname, environ):
         else:
             webname = "/lib/" + rightpart(filename, "/lib/")
 
+        if bundledir and filename.startswith(bundledir + "/"):
+            continue
         if webname and webname != '/lib/':
-            if type=="js":
-                text += sformat("<script type='text/javascript' src='{filename}?v={version}'></script>\n", {"filename": webname,"version":version});
-            else:
-                text += sformat("<link href='{filename}?v={version}' rel='stylesheet' type='text/css'/>\n",{"filename": webname,"version":version});
-    return text
+            files.append((filename, webname, "js" if type == "js" else "css"))
+
+    return _tags(files, version, bundledir, minify)
+
+#-- Jinja2 environments and compiled templates, shared by the whole process
+ENVIRONMENT_CACHE_SIZE = 64
+TEMPLATE_CACHE_SIZE = 256
+_environments = LRUCache(ENVIRONMENT_CACHE_SIZE)
+_templates = LRUCache(TEMPLATE_CACHE_SIZE)
+
+#-- on-disk bytecode cache shared by all the workers: OPENSITUA_JINJA2_CACHE=<dir>,
+#   off when not set: the per-user default of jinja2 would not be shared anyway
+_bytecode_cache = None
+
+def set_bytecode_cache(dirname=None):
+    """
+    set_bytecode_cache - store compiled templates under dirname,
+    None, "" or "off" disable it; a folder that cannot be written is
+    logged and leaves the cache disabled
+    """
+    global _bytecode_cache
+    _bytecode_cache = None
+    if dirname and dirname != "off":
+        if mkdirs(dirname) and os.access(dirname, os.W_OK):
+            # writes go through a temporary file and os.replace, safe for concurrent workers
+            _bytecode_cache = FileSystemBytecodeCache(dirname)
+        else:
+            logger.warning("jinja2 bytecode cache disabled: cannot write to %s", dirname)
+    invalidate_template_cache()
+    return _bytecode_cache
+
+def get_environment(workdir):
+    """
+    get_environment - return the shared jinja2 Environment for the template directory
+    """
+    workdir = normpath(workdir) if workdir else "."
+    env = _environments.get(workdir)
+    if env is None:
+        env = Environment(loader=FileSystemLoader(workdir), bytecode_cache=_bytecode_cache)
+        _environments.set(workdir, env)
+    return env
+
+def get_template(filetpl, st=None):
+    """
+    get_template - return the compiled template, recompiled only when
+    the source file mtime or size changes (st is its os.stat if known),
+    a watched file is not checked: it is dropped on change events
+    """
+    filetpl = normpath(filetpl)
+    generation = _watch_events["count"]
+    watched = is_watched(filetpl)
+    if st is None and watched:
+        item = _templates.get(filetpl, check=lambda item: item[2])
+        if item:
+            return item[1]
+    st = st if st else os.stat(filetpl)
+    signature = (st.st_mtime_ns, st.st_size)
+    item = _templates.get(filetpl, check=lambda item: item[0] == signature)
+    if item:
+        return item[1]
+    env = get_environment(justpath(filetpl))
+    if filetpl in _templates and env.cache is not None:
+        # the source changed: drop the stale copy jinja2 keeps too
+        env.cache.clear()
+    t = env.get_template(justfname(filetpl))
+    _templates.set(filetpl, (signature, t, watched and generation == _watch_events["count"]))
+    return t
+
+def template_cache_info():
+    """
+    template_cache_info - hit/miss statistics of the template cache
+    """
+    return {"environments": _environments.info(), "templates": _templates.info()}
+
+def invalidate_template_cache(pathname=None):
+    """
+    invalidate_template_cache - drop the cached templates under pathname, all if None
+    """
+    if not pathname:
+        _environments.clear()
+        _templates.clear()
+        return
+    pathname = normpath(pathname)
+    for key in _templates.keys():
+        if key == pathname or key.startswith(pathname + "/"):
+            _templates.remove(key)
+    for key in _environments.keys():
+        if key == pathname or key.startswith(pathname + "/"):
+            _environments.remove(key)
+
+set_bytecode_cache(os.environ.get("OPENSITUA_JINJA2_CACHE"))
+
+#-- change events of the watched folders
+_watch_events = {"count": 0}
+_watch_lock = threading.Lock()
+_watched = {}
+
+def _on_change(dirname, name):
+    """
+    _on_change - drop the templates and the asset tags a change touches
+    """
+    _watch_events["count"] += 1
+    if dirname is None:
+        # events were lost
+        invalidate_asset_cache()
+        invalidate_template_cache()
+        return
+    pathname = dirname + "/" + name if name else dirname
+    for key, item in _assets.items():
+        for root in item[4]:
+            # a change inside a root, or to a folder above it (renamed, replaced)
+            if pathname == root or pathname.startswith(root + "/") or root.startswith(pathname + "/"):
+                _assets.remove(key)
+                break
+    invalidate_template_cache(pathname)
+    env = _environments.data.get(dirname)
+    if env is not None and env.cache is not None:
+        # the templates that include or extend the changed one
+        env.cache.clear()
+
+def watch_caches(dirname):
+    """
+    watch_caches - keep the template and asset caches of dirname current with
+    change events instead of checking the files on every hit
+    """
+    if dirname in _watched:
+        return _watched[dirname]
+    watcher = get_watcher(dirname)
+    with _watch_lock:
+        watcher.subscribe(_on_change)
+        _watched[dirname] = watcher.watch(dirname)
+    return _watched[dirname]
+
+def warmup(dirname, filter=r'.*\.(html|map)$'):
+    """
+    warmup - precompile all the templates under dirname into the bytecode cache
+    """
+    compiled, errors = [], []
+    for filename in ls(dirname, filter, recursive=True):
+        try:
+            get_template(filename)
+            compiled.append(filename)
+        except Exception as ex:
+            errors.append((filename, ex))
+    return compiled, errors
 
 def template(filetpl, fileout=None, env = None):
     """
     template -  generate text from jinja2 template file
     """
     env = env if env else {}
-    workdir = justpath(filetpl)
-    workdir = workdir if workdir else "."
-    environ = Environment(loader=FileSystemLoader(workdir))
-    t = environ.get_template(justfname(filetpl))
+    t = get_template(filetpl)
     text = t.render(env).encode("utf-8")
     if fileout:
-        strtofile(text, fileout)
+        strtofile(text, fileout, atomic=True, skipIdentical=True)
     return text
 
-def httpResponse(text, status, start_response):
+def httpResponse(text, status, start_response, environ=None, headers=None):
     """
-    httpResponse
+    httpResponse - the body is compressed when environ accepts gzip/br
     """
-    text = "%s" % str(text)
-    response_headers = [('Content-type', 'text/html'), ('Content-Length', str(len(text)))]
+    data = text if isinstance(text, (bytes,)) else ("%s" % str(text)).encode('utf-8')
+    response_headers = [('Content-type', 'text/html')] + (headers if headers else [])
+    data = compress_response(data, environ, response_headers)
+    response_headers.append(('Content-Length', str(len(data))))
     if start_response:
         start_response(status, response_headers)
-    return [ text.encode('utf-8')]
+    return [data]
 
 
-def httpResponseOK(text, start_response):
+def httpResponseOK(text, start_response, environ=None, headers=None):
     """
     httpResponseOK
     """
-    return httpResponse(text, "200 OK", start_response)
+    return httpResponse(text, "200 OK", start_response, environ, headers)
 
 def httpResponseNotFound(start_response):
     """
@@ -218,6 +640,82 @@ def httpResponseNotFound(start_response):
     """
     return httpResponse("404 NOT FOUND", "404 NOT FOUND", start_response)
 
+def etag(*inputs):
+    """
+    etag - a weak validator computed from the inputs of a response
+    (mtimes, sizes, versions, params...) without generating the body
+    """
+    return 'W/"%s"' % md5text(repr(inputs))
+
+def httpdate(timestamp):
+    """
+    httpdate - format a unix timestamp for Last-Modified
+    """
+    return formatdate(timestamp, usegmt=True)
+
+def conditional_headers(tag, mtime=None):
+    """
+    conditional_headers - the ETag and Last-Modified response headers,
+    give mtime only when the response depends on that file alone
+    """
+    headers = [('ETag', tag)]
+    if mtime:
+        headers.append(('Last-Modified', httpdate(mtime)))
+    return headers
+
+def _tag_matches(header, tag):
+    """
+    _tag_matches - True if the If-None-Match header lists tag (weak comparison) or *
+    """
+    tags = [item.strip() for item in header.split(",")]
+    tag = tag[2:] if tag.startswith("W/") else tag
+    return "*" in tags or tag in [item[2:] if item.startswith("W/") else item for item in tags]
+
+def is_precondition_failed(environ, tag):
+    """
+    is_precondition_failed - True if a method other than GET/HEAD comes with
+    an If-None-Match that matches tag: it gets 412, not 304 (RFC 9110 13.1.2)
+    """
+    if environ.get("REQUEST_METHOD", "GET") in ("GET", "HEAD"):
+        return False
+    return "HTTP_IF_NONE_MATCH" in environ and _tag_matches(environ["HTTP_IF_NONE_MATCH"], tag)
+
+def is_not_modified(environ, tag, mtime=None):
+    """
+    is_not_modified - True if the client already holds the representation
+    identified by tag (If-None-Match) or modified at mtime (If-Modified-Since),
+    mtime=None ignores If-Modified-Since: pass it only when it is a validator
+    as complete as tag, that is when the response depends on that file alone;
+    only GET and HEAD are answered with 304
+    """
+    if environ.get("REQUEST_METHOD", "GET") not in ("GET", "HEAD"):
+        return False
+    if "HTTP_IF_NONE_MATCH" in environ:
+        return _tag_matches(environ["HTTP_IF_NONE_MATCH"], tag)
+    if mtime and "HTTP_IF_MODIFIED_SINCE" in environ:
+        try:
+            since = parsedate_to_datetime(environ["HTTP_IF_MODIFIED_SINCE"]).timestamp()
+        except (TypeError, ValueError, IndexError):
+            return False
+        return int(mtime) <= since
+    return False
+
+def httpResponseNotModified(start_response, headers=None):
+    """
+    httpResponseNotModified - a 304 without body
+    """
+    if start_response:
+        start_response("304 Not Modified", headers if headers else [])
+    return []
+
+def httpResponsePreconditionFailed(start_response, headers=None):
+    """
+    httpResponsePreconditionFailed - a 412 without body
+    """
+    if start_response:
+        start_response("412 Precondition Failed", (headers if headers else []) + [('Content-Length', '0')])
+    return []
+
 def httpImageResponse(data, start_response):
     """
     httpImageResponse
@@ -227,21 +725,205 @@ def httpImageResponse(data, start_response):
         start_response("200 OK", response_headers)
     return [data]
 
-def JSONResponse(obj, start_response):
+FILE_BLOCK_SIZE = 256 * 1024
+# more ranges than this (once merged) get the whole file with 200
+MAX_RANGES = 16
+
+def _filechunks(stream, offset, length, blksize=FILE_BLOCK_SIZE):
+    """
+    _filechunks - yield length bytes of stream from offset, then close it
+    """
+    try:
+        stream.seek(offset)
+        while length > 0:
+            data = stream.read(min(blksize, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        stream.close()
+
+def _byteranges(header, size):
     """
-    JSONResponse
+    _byteranges - parse "bytes=0-99,200-,-50" into [(start, end),...] (end included),
+    sorted with the overlapping and adjacent ranges merged, so the response is
+    never bigger than the file; None if the header is not valid or asks for
+    more than MAX_RANGES ranges, [] if no range is satisfiable
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or not ranges:
+        return None
+    res = []
+    for item in ranges.split(","):
+        start, sep, end = item.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if start.strip() == "":
+                n = int(end)
+                if n <= 0:
+                    continue
+                res.append((max(0, size - n), size - 1))
+            else:
+                start = int(start)
+                end = int(end) if end.strip() else None
+                if end is not None and start > end:
+                    return None
+                end = size - 1 if end is None else end
+                if start < size:
+                    res.append((start, min(end, size - 1)))
+        except ValueError:
+            return None
+    merged = []
+    for start, end in sorted(res):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged if len(merged) <= MAX_RANGES else None
+
+def fileResponse(filename, environ, start_response, mimetype=None, headers=None):
+    """
+    fileResponse - stream a file with wsgi.file_wrapper (sendfile) when the
+    server offers it, answering conditional and Range requests and using
+    the precompressed .br/.gz siblings when the client accepts them
+    """
+    environ = environ if environ else {}
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return httpResponseNotFound(start_response)
+    if not stat.S_ISREG(st.st_mode):
+        return httpResponseNotFound(start_response)
+
+    mimetype = mimetype if mimetype else (mimetypes.guess_type(filename)[0] or "application/octet-stream")
+    response_headers = [('Content-type', mimetype), ('Accept-Ranges', 'bytes')] + (headers if headers else [])
+
+    # precompressed siblings, not used for partial content
+    siblings = [encoding for encoding, ext in (("br", ".br"), ("gzip", ".gz")) if os.path.isfile(filename + ext)]
+    if siblings:
+        response_headers.append(('Vary', 'Accept-Encoding'))
+        encoding = accept_encoding(environ, siblings) if not "HTTP_RANGE" in environ else None
+        if encoding:
+            filename += ".br" if encoding == "br" else ".gz"
+            st = os.stat(filename)
+            response_headers.append(('Content-Encoding', encoding))
+
+    tag = '"%x-%x"' % (st.st_mtime_ns, st.st_size)
+    response_headers += [('ETag', tag), ('Last-Modified', httpdate(st.st_mtime))]
+    if is_not_modified(environ, tag, st.st_mtime):
+        return httpResponseNotModified(start_response, [item for item in response_headers if item[0] != 'Content-type'])
+    if is_precondition_failed(environ, tag):
+        return httpResponsePreconditionFailed(start_response, [item for item in response_headers if item[0] != 'Content-type'])
+
+    size = st.st_size
+    ranges = None
+    if "HTTP_RANGE" in environ:
+        ifrange = environ.get("HTTP_IF_RANGE", "")
+        if not ifrange or ifrange == tag or ifrange == httpdate(st.st_mtime):
+            ranges = _byteranges(environ["HTTP_RANGE"], size)
+        if ranges == []:
+            if start_response:
+                start_response("416 Range Not Satisfiable", [('Content-Range', 'bytes */%d' % size), ('Content-Length', '0')])
+            return []
+
+    stream = open(filename, "rb")
+    if not ranges:
+        response_headers.append(('Content-Length', str(size)))
+        if start_response:
+            start_response("200 OK", response_headers)
+        if "wsgi.file_wrapper" in environ:
+            return environ["wsgi.file_wrapper"](stream, FILE_BLOCK_SIZE)
+        return _filechunks(stream, 0, size)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        response_headers += [('Content-Range', 'bytes %d-%d/%d' % (start, end, size)),
+                             ('Content-Length', str(end - start + 1))]
+        if start_response:
+            start_response("206 Partial Content", response_headers)
+        return _filechunks(stream, start, end - start + 1)
+
+    # multipart/byteranges
+    boundary = md5text("%s%s" % (tag, time.time()))
+    parts = []
+    for start, end in ranges:
+        head = "--%s\r\nContent-Type: %s\r\nContent-Range: bytes %d-%d/%d\r\n\r\n" % (boundary, mimetype, start, end, size)
+        parts.append((head.encode("latin-1"), start, end))
+    tail = ("--%s--\r\n" % boundary).encode("latin-1")
+    length = sum([len(head) + (end - start + 1) + 2 for (head, start, end) in parts]) + len(tail)
+
+    def multipart():
+        try:
+            for head, start, end in parts:
+                yield head
+                stream.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    data = stream.read(min(FILE_BLOCK_SIZE, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    yield data
+                yield b"\r\n"
+            yield tail
+        finally:
+            stream.close()
+
+    response_headers = [item for item in response_headers if item[0] != 'Content-type']
+    response_headers += [('Content-type', 'multipart/byteranges; boundary=%s' % boundary), ('Content-Length', str(length))]
+    if start_response:
+        start_response("206 Partial Content", response_headers)
+    return multipart()
+
+# never served by staticResponse: dotfiles and dot folders, the htaccess.sqlite
+# of the apps and any other database, server side sources and mapfiles
+STATIC_DENY = re.compile(r'^(\..*|htaccess\..*|.*\.(sqlite|sqlite3|db|py|pyc|pyo|wsgi|map|ini|cfg|env))$', re.I)
+
+def is_static(pathname):
+    """
+    is_static - False if a part of the relative pathname must not be served
+    """
+    parts = [part for part in normpath(pathname).split("/") if part]
+    return len(parts) > 0 and not any([STATIC_DENY.match(part) for part in parts])
+
+def staticResponse(environ, start_response, DOCUMENT_WWW=None):
+    """
+    staticResponse - serve PATH_INFO from DOCUMENT_WWW, except the files
+    STATIC_DENY refuses
+    """
+    if not DOCUMENT_WWW:
+        DOCUMENT_ROOT = environ["DOCUMENT_ROOT"] if "DOCUMENT_ROOT" in environ else ""
+        DOCUMENT_WWW = DOCUMENT_ROOT + "/var/www"
+    root = os.path.realpath(DOCUMENT_WWW)
+    pathname = environ.get("PATH_INFO", "").lstrip("/")
+    filename = os.path.realpath(root + "/" + pathname)
+    # do not escape from DOCUMENT_WWW with ../
+    if not filename.startswith(root + os.sep):
+        return httpResponseNotFound(start_response)
+    # check the request and the resolved file: a symlink may hide the real name
+    if not is_static(pathname) or not is_static(filename[len(root):]):
+        return httpResponseNotFound(start_response)
+    return fileResponse(filename, environ, start_response)
+
+def JSONResponse(obj, start_response, environ=None, headers=None):
+    """
+    JSONResponse - the body is compressed when environ accepts gzip/br
     """
     if isstring(obj):
-        text = obj
-    elif isinstance(obj, (dict, list)):
-        text = unicode(json.dumps(obj))
+        data = obj.encode('utf-8')
+    elif isinstance(obj, (bytes,)):
+        data = obj
     else:
-        text = obj
+        data = json_dumps(obj)
 
-    response_headers = [('Content-type', 'application/json'), ('Content-Length', str(len(text)))]
+    response_headers = [('Content-type', 'application/json')] + (headers if headers else [])
+    data = compress_response(data, environ, response_headers)
+    response_headers.append(('Content-Length', str(len(data))))
     if start_response:
         start_response("200 OK", response_headers)
-    return [text.encode('utf-8')]
+    return [data]
 
 def getCookies(environ):
     """
@@ -250,6 +932,52 @@ def getCookies(environ):
     HTTP_COOKIE = environ["HTTP_COOKIE"] if "HTTP_COOKIE" in environ else ""
     return mapify(HTTP_COOKIE,";")
 
+#-- authentication: per-day digest table, token cache
+AUTH_TOKEN_TTL = 60
+_auth_digests = LRUCache(16)
+_auth_tokens = LRUCache(4096)
+
+def _auth_connect(filedb):
+    """
+    _auth_connect - a read-only connection to filedb
+    """
+    uri = "file:%s?mode=ro" % pathname2url(os.path.abspath(filedb))
+    return sqlite3.connect(uri, uri=True)
+
+def _user_digests(filedb, signature, day):
+    """
+    _user_digests - the table {md5(token||day): mail} of the enabled users,
+    built once per day and per version of filedb
+    """
+    key = (filedb, day)
+    item = _auth_digests.get(key, check=lambda item: item[0] == signature)
+    if item:
+        return item[1], item[2]
+
+    # once per day and per version of filedb: no need to keep the connection
+    conn = _auth_connect(filedb)
+    try:
+        rows = conn.execute("SELECT [token],[mail] FROM [users] WHERE [enabled];").fetchall()
+    finally:
+        conn.close()
+
+    digests, everyone = {}, None
+    for (token, mail) in rows:
+        if mail and mail.lower() == "everyone":
+            everyone = mail
+        if token is not None:
+            digests[md5text("%s%s" % (token, day))] = mail
+    _auth_digests.set(key, (signature, digests, everyone))
+    return digests, everyone
+
+def invalidate_auth_cache():
+    """
+    invalidate_auth_cache
+    """
+    _auth_digests.clear()
+    _auth_tokens.clear()
+
+@timed("auth")
 def check_user_permissions(environ):
     """
     check_user_permissions
@@ -260,32 +988,38 @@ def check_user_permissions(environ):
         DOCUMENT_ROOT = environ["DOCUMENT_ROOT"] if "DOCUMENT_ROOT" in environ else leftpart(normpath(__file__), "/var/www/")
         filedb = DOCUMENT_ROOT + "/etc/opengis3/htaccess.sqlite"
 
-    HTTP_COOKIE = getCookies(environ)
-
-    if os.path.isfile(filedb):
-        conn = sqlite3.connect(filedb)
-        conn.create_function("md5", 1, md5text)
-        c = conn.cursor()
-        HTTP_COOKIE["__token__"] = HTTP_COOKIE["__token__"] if "__token__" in HTTP_COOKIE else ""
-
-        sql = """
-        SELECT COUNT(*),[mail] FROM [users] 
-        WHERE ('{__token__}' LIKE md5([token]||strftime('%Y-%m-%d','now')) AND [enabled])
-                OR ([mail] LIKE 'everyone' AND [enabled]);"""
-        sql = sformat(sql, HTTP_COOKIE)
+    try:
+        st = os.stat(filedb)
+    except OSError:
+        return False
+    signature = (st.st_ino, st.st_mtime_ns, st.st_size)
 
-        c.execute(sql)
-        (user_enabled,mail) = c.fetchone()
-        conn.close()
-        return mail if user_enabled else False
+    HTTP_COOKIE = getCookies(environ)
+    token = HTTP_COOKIE["__token__"].lower() if "__token__" in HTTP_COOKIE else ""
+    # same day as strftime('%Y-%m-%d','now') in sqlite, that is UTC
+    day = time.strftime("%Y-%m-%d", time.gmtime())
+    now = time.time()
 
-    return False
+    key = (filedb, token)
+    item = _auth_tokens.get(key, check=lambda item: item[0] > now and item[1] == signature and item[2] == day)
+    if item:
+        return item[3]
 
+    with span("auth_db"):
+        digests, everyone = _user_digests(filedb, signature, day)
+    mail = digests.get(token, everyone) if token else everyone
+    mail = mail if mail else False
+    _auth_tokens.set(key, (now + AUTH_TOKEN_TTL, signature, day, mail))
+    return mail
 
 
-def htmlResponse(environ, start_response=None, checkuser=False):
+def htmlResponse(environ, start_response=None, checkuser=False, conditional=False):
     """
     htmlResponse - return a Html Page
+    conditional=True answers 304 to GET/HEAD when the template, the version,
+    the asset folders and the request are the same (412 to the other methods
+    with a matching If-None-Match); use it only for pages that depend on
+    nothing else
     """
     if checkuser and not check_user_permissions(environ):
         return httpResponseNotFound(start_response)
@@ -296,22 +1030,31 @@ def htmlResponse(environ, start_response=None, checkuser=False):
     #DOCUMENT_ROOT=D:\Users\.....\OpenGIS3
     DOCUMENT_ROOT = environ["DOCUMENT_ROOT"] if "DOCUMENT_ROOT" in environ else ""
     DOCUMENT_WWW  = DOCUMENT_ROOT+"/var/www"
+    if WATCH_ENABLED:
+        watch_caches(DOCUMENT_WWW)
 
-    if not os.path.isfile(url):
+    try:
+        st = os.stat(url)
+    except OSError:
+        return httpResponseNotFound(start_response)
+    if not stat.S_ISREG(st.st_mode):
         return httpResponseNotFound(start_response)
 
     #-- VERSIONE
-    filever = DOCUMENT_ROOT + "/version.txt"
-    version = filetostr(filever)
-    if version:
-        version = re.sub(r'const\s+__version__\s*=\s*', '', version, re.I)
-        version = version.replace("const","").strip('\'\"\r\n')
+    with span("version"):
+        filever = DOCUMENT_ROOT + "/version.txt"
+        version = filetostr(filever)
+        if version:
+            version = re.sub(r'const\s+__version__\s*=\s*', '', version, re.I)
+            version = version.replace("const","").strip('\'\"\r\n')
     environ["__version__"] = version
     #----
+    bundledir = get_bundledir(DOCUMENT_WWW)
+    minify = BUNDLE_MODE == "minify"
+    if bundledir:
+        environ["__bundledir__"] = bundledir
 
     workdir    = justpath(environ["SCRIPT_FILENAME"])
-    template_dir = justpath(url)
-    index_html   = justfname(url)
 
     jss = (DOCUMENT_WWW + "/lib/js", workdir)
 
@@ -319,14 +1062,31 @@ def htmlResponse(environ, start_response=None, checkuser=False):
             DOCUMENT_WWW + "/lib/js",
             DOCUMENT_WWW + "/lib/images", workdir)
 
-    env = Environment(loader=FileSystemLoader(template_dir))
-    t = env.get_template(index_html)
+    with span("loadlibs"):
+        loadjs = loadlibs(jss, "js", version, bundledir, minify)
+        loadcss = loadlibs(csss, "css", version, bundledir, minify)
+
+    headers = []
+    if conditional:
+        user = getCookies(environ).get("__token__", "") if checkuser else ""
+        tag = etag(url, st.st_mtime_ns, st.st_size, version, loadjs, loadcss,
+                   environ.get("QUERY_STRING", ""), environ.get("SCRIPT_FILENAME", ""), user)
+        # the page depends on more than the template mtime (version.txt,
+        # the assets, the request): no Last-Modified, only the ETag validates
+        headers = conditional_headers(tag)
+        if is_not_modified(environ, tag):
+            return httpResponseNotModified(start_response, headers)
+        if is_precondition_failed(environ, tag):
+            return httpResponsePreconditionFailed(start_response, headers)
+
+    with span("template"):
+        t = get_template(url, st)
 
     import opensitua_http as pkg
 
     variables = {
-        "loadjs":     loadlibs(jss, "js", version),   #deprecated!
-        "loadcss":    loadlibs(csss, "css", version), #deprecated!
+        "loadjs":     loadjs,   #deprecated!
+        "loadcss":    loadcss, #deprecated!
         "import" : load,
         "APPNAME": juststem(workdir),
         "DOCUMENT_ROOT" : DOCUMENT_ROOT,
@@ -339,8 +1099,9 @@ def htmlResponse(environ, start_response=None, checkuser=False):
         "__file__":url,
         "__version__":version
     }
-    html = t.render(variables)  #.encode("utf-8","replace")
-    return httpResponseOK(html, start_response)
+    with span("render"):
+        html = t.render(variables)  #.encode("utf-8","replace")
+    return httpResponseOK(html, start_response, environ, headers)
 
 
 if __name__=="__main__":
@@ -29,9 +29,12 @@ from .strings import *
 from .filesystem import *
 from .stime import *
 import operator
+import itertools
 import opensitua_core as pkg
-from opensitua_core import template
-from .http import Params,JSONResponse
+from .http import Params,JSONResponse,template
+from .timing import span, timed
+from .http import etag,conditional_headers,is_not_modified,httpResponseNotModified
+from .http import is_precondition_failed,httpResponsePreconditionFailed
 
 # TYPE [chart|circle|line|point|polygon|raster|query]
 GEOMETRY_TYPE = {
@@ -460,6 +463,61 @@ def renderer_v2(geomtype="POINT", options=None):
     return {}
 
 
+def _raster_info(data):
+    """
+    _raster_info - (minx, miny, maxx, maxy), srs and proj4 of a gdal dataset
+    from its geotransform, size and projection
+    """
+    m, n = data.RasterYSize, data.RasterXSize
+    (x0, px, rotA, y0, rotB, py) = data.GetGeoTransform()
+    prj = data.GetProjection()
+    srs = osr.SpatialReference()
+    if len(prj):
+        srs.ImportFromWkt(prj)
+    else:
+        srs.ImportFromEPSG(3857)
+    epsg = srs.ExportToProj4()
+    proj4 = epsg if epsg.startswith("+proj") else "init=%s" % epsg
+    return (x0, y0 + m * py, x0 + n * px, y0), srs, proj4
+
+
+def _vector_info(layer):
+    """
+    _vector_info - (minx, miny, maxx, maxy), srs and proj4 of an ogr layer
+    """
+    minx, maxx, miny, maxy = layer.GetExtent()
+    srs = layer.GetSpatialRef()
+    if not srs:
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(3857)
+    return (minx, miny, maxx, maxy), srs, srs.ExportToProj4()
+
+
+def layer_extent(filename):
+    """
+    layer_extent - ((minx, miny, maxx, maxy), proj4) of a raster or vector file,
+    (None, None) otherwise. Unlike GDAL_MAPLAYER it only reads: no world file
+    is renamed or written and no statistics (.aux.xml) are computed
+    """
+    ext = justext(filename).lower()
+    info = None
+    if ext in ("tif", "jpg", "jpeg"):
+        data = gdal.Open(normpath(filename), gdalconst.GA_ReadOnly)
+        if data:
+            info = _raster_info(data)
+        del data
+    elif ext in ("shp", "dbf", "sqlite", "dxf"):
+        data = ogr.Open(normpath(filename))
+        if data and data.GetLayer(0):
+            info = _vector_info(data.GetLayer(0))
+        del data
+    if not info:
+        return None, None
+    (minx, miny, maxx, maxy), _, proj4 = info
+    return (min(minx, maxx), min(miny, maxy), max(minx, maxx), max(miny, maxy)), proj4
+
+
+@timed("gdal_maplayer")
 def GDAL_MAPLAYER(filename, layername=None, options=None):
     """
     GDAL_MAPLAYER
@@ -489,8 +547,8 @@ def GDAL_MAPLAYER(filename, layername=None, options=None):
             rename(filetfw, filewld)
 
         if os.path.isfile(filejwg):
-            arr = filetoarray(filejwg)
-            (px, rotA, rotB, py, x0, y0) = [item.strip("\r\n") for item in arr][:6]
+            arr = itertools.islice(iterlines(filejwg), 6)
+            (px, rotA, rotB, py, x0, y0) = [item.strip("\r\n") for item in arr]
             p1 = ogr.CreateGeometryFromWkt("POINT (%s %s)" % (x0, y0))
             srs4326 = osr.SpatialReference()
             srs4326.ImportFromEPSG(4326)
@@ -501,12 +559,12 @@ def GDAL_MAPLAYER(filename, layername=None, options=None):
             x0, y0 = p1.GetX(), p1.GetY()
             text = sformat("""{px}\n{rotA}\n{rotB}\n{py}\n{minx}\n{miny}""",
                            {"px": px, "py": -abs(float(py)), "minx": x0, "miny": y0, "rotA": rotA, "rotB": rotB})
-            strtofile(text, filewld)
+            strtofile(text, filewld, atomic=True, skipIdentical=True)
             #remove(filejwg)
 
         if os.path.isfile(filejgw):
-            arr = filetoarray(filejgw)
-            (px, rotA, rotB, py, x0, y0) = [item.strip("\r\n") for item in arr][:6]
+            arr = itertools.islice(iterlines(filejgw), 6)
+            (px, rotA, rotB, py, x0, y0) = [item.strip("\r\n") for item in arr]
             p1 = ogr.CreateGeometryFromWkt("POINT (%s %s)" % (x0, y0))
             srs4326 = osr.SpatialReference()
             srs4326.ImportFromEPSG(4326)
@@ -517,30 +575,21 @@ def GDAL_MAPLAYER(filename, layername=None, options=None):
             x0, y0 = p1.GetX(), p1.GetY()
             text = sformat("""{px}\n{rotA}\n{rotB}\n{py}\n{minx}\n{miny}""",
                            {"px": px, "py": -abs(float(py)), "minx": x0, "miny": y0, "rotA": rotA, "rotB": rotB})
-            strtofile(text, filewld)
+            strtofile(text, filewld, atomic=True, skipIdentical=True)
             #remove(filejgw)
 
         if os.path.isfile(filejpgw):
             rename(filejpgw, filewld)
 
-        data = gdal.Open(filename, gdalconst.GA_ReadOnly)
+        with span("gdal_open"):
+            data = gdal.Open(filename, gdalconst.GA_ReadOnly)
         if data:
 
             b = data.RasterCount  #number of bands
             band = data.GetRasterBand(1)
             m, n = data.RasterYSize, data.RasterXSize
-            gt, prj = data.GetGeoTransform(), data.GetProjection()
-
-            srs = osr.SpatialReference()
-            if len(prj):
-                srs.ImportFromWkt(prj)
-            else:
-                srs.ImportFromEPSG(3857)
-
-            epsg = srs.ExportToProj4()
-
-
-            proj4 = epsg if epsg.startswith("+proj") else "init=%s" % epsg
+            gt = data.GetGeoTransform()
+            (minx, miny, maxx, maxy), srs, proj4 = _raster_info(data)
             proj = re.findall(r'\+proj=(\w+\d*)', proj4)
             proj = proj[0] if proj else ""
             ellps = re.findall(r'\+ellps=(\w+\d*)', proj4)
@@ -552,27 +601,24 @@ def GDAL_MAPLAYER(filename, layername=None, options=None):
 
             # Warning!!
 
-            stats = band.GetStatistics(True, True)
-            if stats:
-                minValue, maxValue = stats[0], stats[1]
-            else:
-                # Warning!!
-                rdata = band.ReadAsArray(0, 0, n, m)
-                if rdata.dtype in (np.float32,np.float64):
-                    rdata[rdata==nodata] = np.nan
-                    minValue, maxValue = np.asscalar(np.nanmin(rdata)), np.asscalar(np.nanmax(rdata))
+            with span("gdal_statistics"):
+                stats = band.GetStatistics(True, True)
+                if stats:
+                    minValue, maxValue = stats[0], stats[1]
                 else:
-                    rdata = rdata.astype(np.float32)
-                    rdata[rdata == nodata] = np.nan
-                    minValue, maxValue = np.asscalar(np.nanmin(rdata)), np.asscalar(np.nanmax(rdata))
+                    # Warning!!
+                    rdata = band.ReadAsArray(0, 0, n, m)
+                    if rdata.dtype in (np.float32,np.float64):
+                        rdata[rdata==nodata] = np.nan
+                        minValue, maxValue = np.asscalar(np.nanmin(rdata)), np.asscalar(np.nanmax(rdata))
+                    else:
+                        rdata = rdata.astype(np.float32)
+                        rdata[rdata == nodata] = np.nan
+                        minValue, maxValue = np.asscalar(np.nanmin(rdata)), np.asscalar(np.nanmax(rdata))
 
 
             del data
             (x0, px, rotA, y0, rotB, py) = gt
-            minx = x0
-            miny = y0 + m * py
-            maxx = x0 + n * px
-            maxy = y0
             extent = (minx, min(miny, maxy), maxx, max(miny, maxy))
             other = (px, py, nodata, datatype)
             descr = srs.GetName() #srs.GetAttrValue('projcs')
@@ -582,7 +628,7 @@ def GDAL_MAPLAYER(filename, layername=None, options=None):
                     os.path.isfile(filetfw) or os.path.isfile(filejwg) or os.path.isfile(filejgw) or os.path.isfile(filejpgw) or os.path.isfile(filewld)):
                 text = sformat("""{px}\n{rotA}\n{rotB}\n{py}\n{minx}\n{miny}""",
                                {"px": px, "py": -abs(py), "minx": minx, "miny": miny, "rotA": rotA, "rotB": rotB})
-                strtofile(text, filewld)
+                strtofile(text, filewld, atomic=True, skipIdentical=True)
 
             if b == 1 and options and "pipe" in options:
 
@@ -652,20 +698,16 @@ def GDAL_MAPLAYER(filename, layername=None, options=None):
                 "blendMode": 0
             }
     elif ext in ("shp", "dbf", "sqlite", "dxf"):
-        data = ogr.OpenShared(filename)
+        with span("ogr_open"):
+            data = ogr.OpenShared(filename)
         if data and data.GetLayer(layerid):
             layer = data.GetLayer(layerid)
             layername = layer.GetName()
-            minx, maxx, miny, maxy = layer.GetExtent()
+            (minx, miny, maxx, maxy), srs, proj4 = _vector_info(layer)
             geomtype = GEOMETRY_TYPE[layer.GetGeomType()]
             nfeatures = layer.GetFeatureCount(True)
-            srs = layer.GetSpatialRef()
-            if not srs:
-                srs = osr.SpatialReference()
-                srs.ImportFromEPSG(3857)
             if srs:
                 descr = srs.GetAttrValue('projcs')
-                proj4 = srs.ExportToProj4() if srs else "init=epsg:3857"
                 proj = re.findall(r'\+proj=(\w+\d*)', proj4)
                 proj = proj[0] if proj else ""
                 ellps = re.findall(r'\+ellps=(\w+\d*)', proj4)
@@ -765,9 +807,39 @@ def GDAL_MAPLAYER(filename, layername=None, options=None):
 
     return maplayer
 
-def MaplayerResponse(environ, options, start_response):
+# the files next to a dataset that GDAL_MAPLAYER and GDAL read
+MAPLAYER_SIDECARS = ("wld", "tfw", "jwg", "jgw", "jpgw", "prj", "dbf", "shx", "cpg")
+
+def _inputstats(filename):
+    """
+    _inputstats - (mtime_ns, size) of filename and of its sidecar files, None where missing
+    """
+    res = []
+    for pathname in [filename, filename + ".aux.xml"] + [forceext(filename, ext) for ext in MAPLAYER_SIDECARS]:
+        try:
+            st = os.stat(pathname)
+            res.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            res.append(None)
+    return tuple(res)
+
+def _maptag(filemap):
+    """
+    _maptag - the ETag written on the first line of filemap, None if there is none
+    """
+    try:
+        with open(filemap, "rb") as stream:
+            line = stream.readline(256)
+    except OSError:
+        return None
+    return line[len(b"# etag "):].strip().decode("latin-1") if line.startswith(b"# etag ") else None
+
+def MaplayerResponse(environ, options, start_response, conditional=False):
     """
     MaplayerResponse
+    conditional=True answers 304 before opening the dataset when the file,
+    its sidecar files, the map template, the options and the params did not
+    change and the .map on disk was generated from them
     """
     params = Params(environ)
     filename = params.getvalue("filename","no!")
@@ -780,6 +852,22 @@ def MaplayerResponse(environ, options, start_response):
     if os.path.isfile(filename) and DOCUMENT_ROOT and DOCUMENT_WWW:
         filemap   = forceext(filename, "map")
         options = options if options else {"pipe": "singlebandgray"}
+        tplmap = "%s/lib/template/file.map" % (DOCUMENT_WWW)
+
+        headers, tag = [], None
+        if conditional:
+            sttpl = os.stat(tplmap) if os.path.isfile(tplmap) else None
+            tag = etag(filename, _inputstats(filename),
+                       (sttpl.st_mtime_ns, sttpl.st_size) if sttpl else None,
+                       repr(options), APPNAME, PROJECT_DIR, WHERE, DOCUMENT_WWW)
+            # more inputs than one mtime: no Last-Modified, only the ETag validates
+            headers = conditional_headers(tag)
+            # the shared .map must be the one of these inputs, not of other options
+            if is_not_modified(environ, tag) and _maptag(filemap) == tag:
+                return httpResponseNotModified(start_response, headers)
+            if is_precondition_failed(environ, tag):
+                return httpResponsePreconditionFailed(start_response, headers)
+
         # maplayer = GDAL_MAPLAYER(filename, options={"pipe": "singlebandgray"})
 
         # maplayer = GDAL_MAPLAYER(filename, layername,
@@ -800,14 +888,19 @@ def MaplayerResponse(environ, options, start_response):
             "WHERE": WHERE
         }
         # jinja2 template
-        tplmap ="{DOCUMENT_WWW}/lib/template/file.map".format(**variables)
-        template(tplmap, filemap, variables)
+        with span("mapfile"):
+            if tag:
+                # mapserver skips the comment, the next requests compare it
+                text = template(tplmap, None, variables)
+                strtofile([("# etag %s\n" % tag).encode("latin-1"), text], filemap, atomic=True, skipIdentical=True)
+            else:
+                template(tplmap, filemap, variables)
         # none.html
         filenone = justpath(filemap) + "/none.html"
         if not os.path.isfile(filenone):
-            strtofile("""// mapserver template\n{ "x":[x], "y":[y], "value_0": [value_0] }""", filenone)
-        return JSONResponse(maplayer, start_response)
-    return JSONResponse({"exception":"some params missing"}, start_response)
+            strtofile("""// mapserver template\n{ "x":[x], "y":[y], "value_0": [value_0] }""", filenone, atomic=True, skipIdentical=True)
+        return JSONResponse(maplayer, start_response, environ, headers)
+    return JSONResponse({"exception":"some params missing"}, start_response, environ)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,250 @@
+# -----------------------------------------------------------------------------
+# Licence:
+# Copyright (c) 2012-2019 Luzzi Valerio
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Name:        multipart.py
+# Purpose:     streaming parser of POST bodies
+#
+# Author:      Luzzi Valerio
+#
+# Created:     17/10/2026
+# -----------------------------------------------------------------------------
+import io
+import re
+import shutil
+import tempfile
+from urllib.parse import parse_qs
+
+SPOOL_THRESHOLD = 1024 * 1024           # parts bigger than this go to a temporary file
+MAX_CONTENT_LENGTH = 2 * 1024 ** 3      # refuse request bodies bigger than this
+MAX_HEADER_SIZE = 16 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class RequestTooLarge(ValueError):
+    """
+    RequestTooLarge - the request body exceeds the allowed size
+    """
+    pass
+
+
+class FileUpload:
+    """
+    FileUpload - a file part of a multipart/form-data request
+    """
+
+    def __init__(self, name, filename, content_type, spool_threshold=SPOOL_THRESHOLD):
+        """
+        constructor
+        """
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self.spool_threshold = spool_threshold
+        self.file = io.BytesIO()
+
+    def write(self, data):
+        """
+        write - append data, moving to a temporary file over the threshold
+        """
+        self.size += len(data)
+        if isinstance(self.file, io.BytesIO) and self.size > self.spool_threshold:
+            spooled = tempfile.NamedTemporaryFile(prefix="upload_")
+            spooled.write(self.file.getvalue())
+            self.file = spooled
+        self.file.write(data)
+
+    @property
+    def path(self):
+        """
+        path - the temporary file on disk, None when the part is held in memory
+        """
+        return self.file.name if not isinstance(self.file, io.BytesIO) else None
+
+    def read(self, size=-1):
+        """
+        read
+        """
+        return self.file.read(size)
+
+    def seek(self, offset, whence=0):
+        """
+        seek
+        """
+        return self.file.seek(offset, whence)
+
+    def save(self, filename):
+        """
+        save - copy the uploaded content into filename
+        """
+        self.file.seek(0)
+        with open(filename, "wb") as stream:
+            shutil.copyfileobj(self.file, stream, CHUNK_SIZE)
+        self.file.seek(0)
+        return filename
+
+    def close(self):
+        """
+        close - release the temporary file
+        """
+        self.file.close()
+
+    def __iter__(self):
+        self.file.seek(0)
+        while True:
+            data = self.file.read(CHUNK_SIZE)
+            if not data:
+                break
+            yield data
+        self.file.seek(0)
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return "FileUpload(%r, %r, %d bytes)" % (self.name, self.filename, self.size)
+
+
+def _header_params(value):
+    """
+    _header_params - 'form-data; name="a"; filename="b"' => ("form-data", {"name":"a","filename":"b"})
+    """
+    parts = value.split(";")
+    params = {}
+    for item in re.findall(r';\s*([\w\-\*]+)\s*=\s*("(?:[^"\\]|\\.)*"|[^;]*)', value):
+        key, val = item[0].lower(), item[1].strip()
+        if len(val) >= 2 and val[0] == val[-1] == '"':
+            val = val[1:-1].replace('\\"', '"')
+        params[key] = val
+    return parts[0].strip().lower(), params
+
+
+def _reader(stream, length, max_content_length):
+    """
+    _reader - yield the request body by chunks, enforcing the size limit
+    """
+    if length is not None and max_content_length and length > max_content_length:
+        raise RequestTooLarge("request body of %d bytes exceeds %d" % (length, max_content_length))
+    total = 0
+    while length is None or total < length:
+        size = CHUNK_SIZE if length is None else min(CHUNK_SIZE, length - total)
+        data = stream.read(size)
+        if not data:
+            break
+        total += len(data)
+        if max_content_length and total > max_content_length:
+            raise RequestTooLarge("request body exceeds %d bytes" % (max_content_length))
+        yield data
+
+
+def _add(fields, name, value):
+    fields.setdefault(name, []).append(value)
+
+
+def parse_multipart(chunks, boundary, spool_threshold=SPOOL_THRESHOLD):
+    """
+    parse_multipart - parse the multipart/form-data chunks into {name:[values]},
+    the file parts become FileUpload objects
+    """
+    fields = {}
+    delimiter = b"--" + boundary
+    marker = b"\r\n" + delimiter
+    buffer = b""
+    chunks = iter(chunks)
+
+    def more():
+        data = next(chunks, None)
+        if data is None:
+            raise ValueError("unexpected end of multipart body")
+        return data
+
+    # skip the preamble up to the first delimiter
+    while True:
+        pos = buffer.find(delimiter)
+        if pos >= 0:
+            buffer = buffer[pos + len(delimiter):]
+            break
+        buffer = buffer[-len(delimiter):] + more()
+
+    while True:
+        while len(buffer) < 2:
+            buffer += more()
+        if buffer.startswith(b"--"):
+            break
+        # part headers
+        while b"\r\n\r\n" not in buffer:
+            if len(buffer) > MAX_HEADER_SIZE:
+                raise ValueError("multipart headers too large")
+            buffer += more()
+        head, buffer = buffer.split(b"\r\n\r\n", 1)
+        headers = {}
+        for line in head.decode("utf-8", "replace").split("\r\n"):
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        _, params = _header_params(headers.get("content-disposition", ""))
+        name = params.get("name", "")
+        if "filename" in params:
+            part = FileUpload(name, params["filename"], headers.get("content-type", "application/octet-stream"), spool_threshold)
+        else:
+            part = FileUpload(name, None, headers.get("content-type", "text/plain"), spool_threshold)
+
+        # part body: stream everything up to the next delimiter
+        while True:
+            pos = buffer.find(marker)
+            if pos >= 0:
+                part.write(buffer[:pos])
+                buffer = buffer[pos + len(marker):]
+                break
+            keep = len(marker) - 1
+            if len(buffer) > keep:
+                part.write(buffer[:-keep])
+                buffer = buffer[-keep:]
+            buffer += more()
+
+        part.seek(0)
+        if part.filename is None:
+            value = part.read()
+            _, ctparams = _header_params(part.content_type)
+            _add(fields, name, value.decode(ctparams.get("charset", "utf-8"), "replace"))
+            part.close()
+        else:
+            _add(fields, name, part)
+
+    return fields
+
+
+def parse_form(environ, spool_threshold=SPOOL_THRESHOLD, max_content_length=MAX_CONTENT_LENGTH):
+    """
+    parse_form - parse the body of a POST request into {name:[values]}
+    """
+    mimetype, params = _header_params(environ.get("CONTENT_TYPE", ""))
+    try:
+        length = int(environ["CONTENT_LENGTH"])
+    except (KeyError, ValueError):
+        length = None
+
+    if mimetype == "multipart/form-data" and "boundary" in params:
+        chunks = _reader(environ["wsgi.input"], length, max_content_length)
+        return parse_multipart(chunks, params["boundary"].encode("latin-1"), spool_threshold)
+
+    if mimetype in ("application/x-www-form-urlencoded", ""):
+        body = b"".join(_reader(environ["wsgi.input"], length, max_content_length))
+        return parse_qs(body.decode("utf-8", "replace"), keep_blank_values=True)
+
+    # other bodies (json, xml...) are left unread for the handler
+    return {}
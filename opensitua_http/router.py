@@ -0,0 +1,252 @@
+# -----------------------------------------------------------------------------
+# Licence:
+# Copyright (c) 2012-2019 Luzzi Valerio
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Name:        router.py
+# Purpose:     precompiled WSGI dispatch
+#
+# Author:      Luzzi Valerio
+#
+# Created:     17/10/2026
+# -----------------------------------------------------------------------------
+import os,re
+from .filesystem import normpath, forceext
+from .http import htmlResponse, JSONResponse, httpResponse, httpResponseNotFound
+
+# <name>, <name:int>, <name:path>
+CONVERTERS = {
+    "str": (r'[^/]+', str),
+    "int": (r'\d+', int),
+    "float": (r'\d+(?:\.\d+)?', float),
+    "path": (r'.+', str),
+}
+
+_PARAM = re.compile(r'<(\w+)(?::(\w+))?>')
+_PATHPARAM = re.compile(r'<\w+:path>')
+
+
+def _compile_segment(pattern, text):
+    """
+    _compile_segment - the regex and the converters of one segment of pattern
+    """
+    regex, converters, pos = "", {}, 0
+    for m in _PARAM.finditer(text):
+        name, kind = m.group(1), m.group(2) or "str"
+        if not kind in CONVERTERS:
+            raise ValueError("unknown converter <%s:%s> in %s" % (name, kind, pattern))
+        regex += re.escape(text[pos:m.start()])
+        regex += "(?P<%s>%s)" % (name, CONVERTERS[kind][0])
+        converters[name] = CONVERTERS[kind][1]
+        pos = m.end()
+    regex += re.escape(text[pos:])
+    return re.compile(regex), converters
+
+
+class Route:
+    """
+    Route - a pattern bound to a WSGI handler(environ, start_response)
+    """
+
+    def __init__(self, pattern, handler, methods=None):
+        """
+        constructor
+        """
+        self.pattern = pattern
+        self.handler = handler
+        self.methods = tuple([method.upper() for method in methods]) if methods else None
+        # [(text, regex, converters),...] per path segment, regex is None for
+        # the static ones; a segment with a <name:path> takes the rest of the path
+        self.segments = []
+        self.tail = False
+        parts = pattern.split("/")
+        for j, text in enumerate(parts):
+            if not "<" in text:
+                self.segments.append((text, None, None))
+                continue
+            if _PATHPARAM.search(text):
+                text = "/".join(parts[j:])
+                self.tail = True
+            regex, converters = _compile_segment(pattern, text)
+            self.segments.append((text, regex, converters))
+            if self.tail:
+                break
+        self.static = all([regex is None for (_, regex, _) in self.segments])
+
+    def allows(self, method):
+        """
+        allows - True if the route answers method
+        """
+        return not self.methods or method in self.methods
+
+
+class _Node:
+    """
+    _Node - a node of the segment trie
+    """
+    __slots__ = ("static", "dynamic", "tails", "routes")
+
+    def __init__(self):
+        self.static = {}
+        self.dynamic = {}
+        self.tails = {}
+        self.routes = []
+
+
+class Router:
+    """
+    Router - compiles the routes once into a dict of the static paths and a
+    trie of path segments, with regexes only at the parameter segments: a
+    lookup walks the segments of the path, whatever the number of routes.
+    Static segments win over parameters; the routes of the same path are
+    tried in the order they were added, by method
+    """
+
+    def __init__(self):
+        """
+        constructor
+        """
+        self.routes = []
+        self.compiled = False
+        self._static = {}
+        self._root = _Node()
+
+    def add(self, pattern, handler, methods=None):
+        """
+        add - bind pattern to handler(environ, start_response), the url
+        parameters are in environ["route.params"]
+        """
+        route = Route(pattern, handler, methods)
+        self.routes.append(route)
+        self.compiled = False
+        return route
+
+    def route(self, pattern, methods=None):
+        """
+        route - decorator form of add
+        """
+        def decorator(handler):
+            self.add(pattern, handler, methods)
+            return handler
+        return decorator
+
+    def html(self, pattern, filetpl, checkuser=False, conditional=False, methods=None):
+        """
+        html - serve the template with htmlResponse, its path is resolved once here
+        """
+        url = forceext(normpath(filetpl), "html")
+        if not os.path.isfile(url):
+            raise ValueError("template %s not found" % url)
+
+        def handler(environ, start_response):
+            environ["url"] = url
+            return htmlResponse(environ, start_response, checkuser, conditional)
+        return self.add(pattern, handler, methods)
+
+    def json(self, pattern, func, methods=None):
+        """
+        json - serve the value of func(environ, **params) with JSONResponse
+        """
+        def handler(environ, start_response):
+            return JSONResponse(func(environ, **environ["route.params"]), start_response, environ)
+        return self.add(pattern, handler, methods)
+
+    def compile(self):
+        """
+        compile - build the dispatch table
+        """
+        self._static, self._root = {}, _Node()
+        for route in self.routes:
+            if route.static:
+                self._static.setdefault(route.pattern, []).append(route)
+                continue
+            node = self._root
+            for j, (text, regex, converters) in enumerate(route.segments):
+                if regex is None:
+                    node = node.static.setdefault(text, _Node())
+                else:
+                    edges = node.tails if route.tail and j == len(route.segments) - 1 else node.dynamic
+                    if not text in edges:
+                        edges[text] = (regex, converters, _Node())
+                    node = edges[text][2]
+            node.routes.append(route)
+        self.compiled = True
+
+    def _walk(self, node, parts, j, params):
+        """
+        _walk - yield (route, params) for the routes under node matching parts[j:]
+        """
+        if j == len(parts):
+            for route in node.routes:
+                yield route, params
+            return
+        child = node.static.get(parts[j])
+        if child:
+            for item in self._walk(child, parts, j + 1, params):
+                yield item
+        for regex, converters, child in node.dynamic.values():
+            m = regex.fullmatch(parts[j])
+            if m:
+                values = dict(params)
+                for name in converters:
+                    values[name] = converters[name](m.group(name))
+                for item in self._walk(child, parts, j + 1, values):
+                    yield item
+        if node.tails:
+            rest = "/".join(parts[j:])
+            for regex, converters, child in node.tails.values():
+                m = regex.fullmatch(rest)
+                if m:
+                    values = dict(params)
+                    for name in converters:
+                        values[name] = converters[name](m.group(name))
+                    for route in child.routes:
+                        yield route, values
+
+    def lookup(self, path):
+        """
+        lookup - yield (route, params) of every route matching path, the best first
+        """
+        if not self.compiled:
+            self.compile()
+        for route in self._static.get(path, []):
+            yield route, {}
+        for item in self._walk(self._root, path.split("/"), 0, {}):
+            yield item
+
+    def match(self, path, method=None):
+        """
+        match - (route, params) for path and method (any if None),
+        (None, None) if no route matches
+        """
+        for route, params in self.lookup(path):
+            if method is None or route.allows(method):
+                return route, params
+        return None, None
+
+    def __call__(self, environ, start_response):
+        """
+        WSGI entry point
+        """
+        method = environ.get("REQUEST_METHOD", "GET")
+        allowed = []
+        for route, params in self.lookup(environ.get("PATH_INFO", "") or "/"):
+            if route.allows(method):
+                environ["route.params"] = params
+                return route.handler(environ, start_response)
+            allowed += [item for item in route.methods if not item in allowed]
+        if allowed:
+            return httpResponse("405 METHOD NOT ALLOWED", "405 METHOD NOT ALLOWED", start_response, headers=[("Allow", ", ".join(allowed))])
+        return httpResponseNotFound(start_response)
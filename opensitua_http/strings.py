@@ -25,6 +25,7 @@
 import re
 import six
 import random
+import functools
 
 def isstring(var):
     """
@@ -39,28 +40,113 @@ def isarray(var):
     """
     return isinstance(var, (list, tuple))
 
+REGEX_CACHE_SIZE = 256
+
+
+@functools.lru_cache(maxsize=REGEX_CACHE_SIZE)
+def _regex(pattern, flags=0):
+    """
+    _regex - the compiled pattern, shared by the string functions
+    """
+    return re.compile(pattern, flags)
+
+
+def _textof(value):
+    """
+    _textof - batch items as text: bytes are decoded, other values formatted
+    """
+    if isstring(value):
+        return value
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return "%s" % (value)
+
+
+def _batch(func, values, dtype=object):
+    """
+    _batch - func applied to each item of a list, or of a numpy array
+    returning a numpy array of the same shape
+    """
+    if type(values).__module__ == "numpy" and hasattr(values, "tolist"):
+        import numpy as np
+        res = [func(_textof(item)) for item in values.ravel().tolist()]
+        return np.array(res, dtype=dtype).reshape(values.shape)
+    return [func(_textof(item)) for item in values]
+
+
+_NUMERIC = re.compile(r'^[-+]?((\d+(\.\d*)?)|(\d*\.\d+))([eE][-+]?\d+)?$')
+_QUERY = re.compile(r'^\s*((SELECT|PRAGMA|INSERT|DELETE|REPLACE|UPDATE|CREATE).*)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
 def isnumeric(text):
     """
     isnumeric - say yes if it'a number
     """
-    match =  re.match("^[-+]?((\d+(\.\d*)?)|(\d*\.\d+))([eE][-+]?\d+)?$", text.strip())
+    match = _NUMERIC.match(text.strip())
     return True if match else False
 
+
+def isnumeric_batch(values):
+    """
+    isnumeric_batch - isnumeric of each value, a bool array for a numpy array
+    """
+    match = _NUMERIC.match
+    return _batch(lambda text: match(text.strip()) is not None, values, bool)
+
+
 def isquery(text):
     """
     isquery
     """
-    pattern = r'^\s*((SELECT|PRAGMA|INSERT|DELETE|REPLACE|UPDATE|CREATE).*)'
-    res = re.match(pattern, text, re.IGNORECASE)
+    res = _QUERY.match(text)
     return True if res else False
 
+
+def isquery_batch(values):
+    """
+    isquery_batch - isquery of each value, a bool array for a numpy array
+    """
+    match = _QUERY.match
+    return _batch(lambda text: match(text) is not None, values, bool)
+
+SFORMAT_CACHE_SIZE = 256
+_PLACEHOLDER = re.compile(r'\{([^{}]*)\}')
+
+
+@functools.lru_cache(maxsize=SFORMAT_CACHE_SIZE)
+def _sformat_parse(text):
+    """
+    _sformat_parse - text as (literal, name, literal, name, ..., literal)
+    """
+    return tuple(_PLACEHOLDER.split(text))
+
+
 def sformat(text, args):
     """
-    sformat
+    sformat - replace {key} with args[key] in a single pass,
+    unknown placeholders are left as they are
     """
-    for key in args:
-        text = text.replace("{%s}" % key, "%s" % (args[key]))
-    return text
+    if not args:
+        return text
+    parts = _sformat_parse(text)
+    if len(parts) == 1:
+        return text
+    values = None
+    res = [parts[0]]
+    for j in range(1, len(parts), 2):
+        name = parts[j]
+        if name in args:
+            res.append("%s" % (args[name]))
+        else:
+            # keys that are not strings, e.g. {1}
+            if values is None:
+                values = {}
+                for key in args:
+                    values.setdefault("%s" % key, args[key])
+            res.append("%s" % (values[name]) if name in values else "{%s}" % name)
+        res.append(parts[j + 1])
+    return "".join(res)
 
 def lower(text):
     """
@@ -201,30 +287,58 @@ def textin(text, prefix, postfix, casesensitive=True):
     textin - return text between prefix and suffix excluded
     """
 
-    if casesensitive:
-        g = re.search(r'(?<=' + prefix + ')(.*?)(?=' + postfix + ')', text)
-    else:
-        g = re.search(r'(?<=' + prefix + ')(.*?)(?=' + postfix + ')', text, re.IGNORECASE)
-
+    pattern = r'(?<=' + prefix + ')(.*?)(?=' + postfix + ')'
+    g = _regex(pattern, 0 if casesensitive else re.IGNORECASE).search(text)
     return g.group() if g else ""
 
 
+def textin_batch(values, prefix, postfix, casesensitive=True):
+    """
+    textin_batch - textin of each value
+    """
+    pattern = r'(?<=' + prefix + ')(.*?)(?=' + postfix + ')'
+    search = _regex(pattern, 0 if casesensitive else re.IGNORECASE).search
+
+    def func(text):
+        g = search(text)
+        return g.group() if g else ""
+    return _batch(func, values)
+
+
 def textbetween(text, prefix, postfix, casesensitive=True):
     """
     textin - return text between prefix and suffix excluded
     """
-    if casesensitive:
-        g = re.search(r'' + prefix + '(.*?)' + postfix, text, re.DOTALL)
-    else:
-        g = re.search(r'' + prefix + '(.*?)' + postfix, text, re.IGNORECASE|re.DOTALL)
+    pattern = r'' + prefix + '(.*?)' + postfix
+    g = _regex(pattern, re.DOTALL if casesensitive else re.IGNORECASE|re.DOTALL).search(text)
     return g.group() if g else ""
 
 
+def textbetween_batch(values, prefix, postfix, casesensitive=True):
+    """
+    textbetween_batch - textbetween of each value
+    """
+    pattern = r'' + prefix + '(.*?)' + postfix
+    search = _regex(pattern, re.DOTALL if casesensitive else re.IGNORECASE|re.DOTALL).search
+
+    def func(text):
+        g = search(text)
+        return g.group() if g else ""
+    return _batch(func, values)
+
+
 def normalizestring(text):
     """
     normalizestring
     """
-    return re.sub(r'\s+', ' ', text)
+    return _SPACES.sub(' ', text)
+
+
+def normalizestring_batch(values):
+    """
+    normalizestring_batch - normalizestring of each value
+    """
+    return _batch(lambda text: _SPACES.sub(' ', text), values)
 
 
 def wrap(text, leftc, rightc=None):
@@ -253,9 +367,12 @@ def unwrap(text, leftc, rightc=None):
         return [unwrap(item, leftc, rightc) for item in text]
 
 
-def split(text, sep=" ", glue="'", removeEmpty=False):
+SPLIT_CACHE_SIZE = 128
+
+
+def _split_legacy(text, sep=" ", glue="'", removeEmpty=False):
     """
-    split - a variant of split with glue characters
+    _split_legacy - the char by char split, still used for an empty sep
     """
     res = []
     word = ""
@@ -278,6 +395,62 @@ def split(text, sep=" ", glue="'", removeEmpty=False):
     return res
 
 
+@functools.lru_cache(maxsize=SPLIT_CACHE_SIZE)
+def _split_scanner(sep, glue):
+    """
+    _split_scanner - the regex of glue chars or sep positions and the regex
+    of glue chars alone (None without glue)
+    """
+    chars = "".join([re.escape(c) for c in glue])
+    if not chars:
+        return re.compile(r'(?=%s)' % re.escape(sep)), None
+    return re.compile(r'(?P<g>[%s])|(?=%s)' % (chars, re.escape(sep))), re.compile(r'[%s]' % chars)
+
+
+def split(text, sep=" ", glue="'", removeEmpty=False):
+    """
+    split - a variant of split with glue characters
+    """
+    if not sep or not isstring(sep) or not isstring(glue) or not isstring(text):
+        return _split_legacy(text, sep, glue, removeEmpty)
+
+    scanner, gluechars = _split_scanner(sep, glue)
+    if len(sep) == 1 and (gluechars is None or not gluechars.search(text)):
+        res = text.split(sep)
+    else:
+        # a glue char toggles the quoting before sep is tested at the same
+        # position, a split drops only the char where sep starts
+        res, start, pos = [], 0, 0
+        dontsplit = False
+        while True:
+            if dontsplit:
+                m = gluechars.search(text, pos)
+                if m is None:
+                    break
+                j = m.start()
+                dontsplit = False
+                if text.startswith(sep, j):
+                    res.append(text[start:j])
+                    start = j + 1
+            else:
+                m = scanner.search(text, pos)
+                if m is None:
+                    break
+                j = m.start()
+                if m.lastgroup == "g":
+                    dontsplit = True
+                else:
+                    res.append(text[start:j])
+                    start = j + 1
+            pos = j + 1
+        res.append(text[start:])
+
+    if removeEmpty and len(res[-1].strip()) == 0:
+        res.pop()
+
+    return res
+
+
 def listify(text, sep=",", glue="\""):
     """
     listify -  make a list from string
@@ -0,0 +1,164 @@
+# -----------------------------------------------------------------------------
+# Licence:
+# Copyright (c) 2012-2019 Luzzi Valerio
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Name:        timing.py
+# Purpose:     per-request spans and Server-Timing headers
+#
+# Author:      Luzzi Valerio
+#
+# Created:     17/10/2026
+# -----------------------------------------------------------------------------
+import os,re
+import json
+import time
+import logging
+import functools
+import contextvars
+
+# OPENSITUA_TIMING=1 turns on the TimingMiddleware
+TIMING_ENABLED = os.environ.get("OPENSITUA_TIMING", "").lower() in ("1", "true", "on")
+
+logger = logging.getLogger("opensitua_http.timing")
+
+# the spans of the request in progress, None outside a timed request
+_spans = contextvars.ContextVar("opensitua_http_spans", default=None)
+
+
+class _NullSpan:
+    """
+    _NullSpan - what span() returns when no request is being timed
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """
+    Span - a timed section of the request
+    """
+    __slots__ = ("name", "spans", "t0")
+
+    def __init__(self, name, spans):
+        """
+        constructor
+        """
+        self.name = name
+        self.spans = spans
+        self.t0 = 0.0
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.spans.append((self.name, time.perf_counter() - self.t0))
+        return False
+
+
+def span(name):
+    """
+    span - with span("render"): ... times the block when a request is timed
+    """
+    spans = _spans.get()
+    return Span(name, spans) if spans is not None else _NULL_SPAN
+
+
+def timed(name=None):
+    """
+    timed - decorator form of span
+    """
+    def decorator(func):
+        label = name if name else func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            spans = _spans.get()
+            if spans is None:
+                return func(*args, **kwargs)
+            with Span(label, spans):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing(spans, total=None):
+    """
+    server_timing - the Server-Timing header value, repeated spans are summed
+    """
+    durations, order = {}, []
+    for name, seconds in spans:
+        name = re.sub(r'[^\w\-]', '_', name)
+        if not name in durations:
+            order.append(name)
+            durations[name] = 0.0
+        durations[name] += seconds
+    items = ["%s;dur=%.2f" % (name, durations[name] * 1000) for name in order]
+    if total is not None:
+        items.append("total;dur=%.2f" % (total * 1000))
+    return ", ".join(items)
+
+
+class TimingMiddleware:
+    """
+    TimingMiddleware - collect the spans of each request into a Server-Timing
+    header and, with log=True, into one json log line
+    """
+
+    def __init__(self, app, enabled=None, log=False):
+        """
+        constructor
+        """
+        self.app = app
+        self.enabled = TIMING_ENABLED if enabled is None else enabled
+        self.log = log
+
+    def __call__(self, environ, start_response):
+        if not self.enabled:
+            return self.app(environ, start_response)
+
+        spans = []
+        token = _spans.set(spans)
+        t0 = time.perf_counter()
+        status = {}
+
+        def timing_start_response(code, headers, exc_info=None):
+            status["code"] = code
+            headers = list(headers) + [('Server-Timing', server_timing(spans, time.perf_counter() - t0))]
+            return start_response(code, headers, exc_info) if exc_info else start_response(code, headers)
+
+        try:
+            result = self.app(environ, timing_start_response)
+        finally:
+            _spans.reset(token)
+
+        if self.log:
+            logger.info(json.dumps({
+                "method": environ.get("REQUEST_METHOD", ""),
+                "path": environ.get("PATH_INFO", "") or environ.get("SCRIPT_FILENAME", ""),
+                "status": status.get("code", ""),
+                "total_ms": round((time.perf_counter() - t0) * 1000, 2),
+                "spans": [{"name": name, "ms": round(seconds * 1000, 2)} for name, seconds in spans]
+            }))
+        return result
@@ -0,0 +1,57 @@
+# -----------------------------------------------------------------------------
+# Licence:
+# Copyright (c) 2012-2019 Luzzi Valerio
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Name:        warmup.py
+# Purpose:     precompile the jinja2 templates at deploy time
+#
+# Author:      Luzzi Valerio
+#
+# Created:     17/10/2026
+# -----------------------------------------------------------------------------
+import os,sys
+import argparse
+from .http import set_bytecode_cache, warmup
+
+
+def main(argv=None):
+    """
+    main - opensitua_warmup DOCUMENT_WWW [--cache-dir dir]
+    """
+    parser = argparse.ArgumentParser(description="Precompile .html and .map templates into the jinja2 bytecode cache")
+    parser.add_argument("DOCUMENT_WWW", help="the root of the templates, e.g. $DOCUMENT_ROOT/var/www")
+    parser.add_argument("--cache-dir", default=os.environ.get("OPENSITUA_JINJA2_CACHE"),
+                        help="bytecode cache directory shared by the workers, the same as their "
+                             "$OPENSITUA_JINJA2_CACHE (default $OPENSITUA_JINJA2_CACHE)")
+    args = parser.parse_args(argv)
+
+    if not args.cache_dir or args.cache_dir == "off":
+        # the workers read only the folder they are configured with
+        print("warning: no --cache-dir nor OPENSITUA_JINJA2_CACHE, the templates are only checked", file=sys.stderr)
+    elif not set_bytecode_cache(args.cache_dir):
+        print("cannot write to %s" % (args.cache_dir), file=sys.stderr)
+        return 1
+    else:
+        print("bytecode cache: %s" % (args.cache_dir))
+    compiled, errors = warmup(args.DOCUMENT_WWW)
+    for filename, ex in errors:
+        print("skipped %s: %s" % (filename, ex))
+    print("%d templates compiled, %d skipped" % (len(compiled), len(errors)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
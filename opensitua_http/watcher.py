@@ -0,0 +1,516 @@
+# -----------------------------------------------------------------------------
+# Licence:
+# Copyright (c) 2012-2019 Luzzi Valerio
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+#
+# Name:        watcher.py
+# Purpose:     change events for watched folders, inotify or polling
+#
+# Author:      Luzzi Valerio
+#
+# Created:     17/10/2026
+# -----------------------------------------------------------------------------
+import os,re
+import abc
+import time
+import errno
+import select
+import struct
+import logging
+import threading
+from .filesystem import normpath, iterlistdir
+
+# OPENSITUA_WATCH=1 makes htmlResponse watch DOCUMENT_WWW,
+# OPENSITUA_WATCHER=poll forces the polling watcher
+WATCH_ENABLED = os.environ.get("OPENSITUA_WATCH", "").lower() in ("1", "true", "on")
+WATCH_INTERVAL = float(os.environ.get("OPENSITUA_WATCH_INTERVAL", "1.0"))
+
+logger = logging.getLogger("opensitua_http.watcher")
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+_EVENT = struct.Struct("iIII")
+
+# inotify does not see the changes made by other hosts on these: they are polled
+NETWORK_FILESYSTEMS = ("nfs", "nfs4", "cifs", "smb3", "smbfs", "ncpfs", "afs", "coda", "9p", "ceph",
+                       "glusterfs", "lustre", "gpfs", "davfs", "fuse.sshfs", "fuse.glusterfs",
+                       "fuse.cephfs", "fuse.s3fs", "fuse.rclone", "fuse.davfs2")
+MOUNTS_TTL = 10.0
+_mounts_cache = {"time": 0.0, "mounts": []}
+
+_libc = None
+
+
+def _inotify():
+    """
+    _inotify - the libc with the inotify functions, None where there is none
+    """
+    global _libc
+    if _libc is None:
+        try:
+            import ctypes, ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+            _libc = libc
+        except (OSError, AttributeError):
+            _libc = False
+    return _libc if _libc else None
+
+
+def _unescape(text):
+    """
+    _unescape - decode the \\040 escapes of /proc/mounts
+    """
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), text)
+
+
+def _mounts():
+    """
+    _mounts - [(mountpoint, fstype),...] of /proc/mounts, the longest first,
+    [] where there is none
+    """
+    now = time.time()
+    if now - _mounts_cache["time"] > MOUNTS_TTL:
+        mounts = []
+        try:
+            with open("/proc/mounts", "r") as stream:
+                for line in stream:
+                    fields = line.split()
+                    if len(fields) >= 3:
+                        mounts.append((_unescape(fields[1]), fields[2]))
+        except OSError:
+            pass
+        mounts.sort(key=lambda item: len(item[0]), reverse=True)
+        _mounts_cache["time"], _mounts_cache["mounts"] = now, mounts
+    return _mounts_cache["mounts"]
+
+
+def is_network_fs(pathname):
+    """
+    is_network_fs - True if pathname is on a network filesystem (NFS, SMB...)
+    """
+    pathname = os.path.realpath(pathname)
+    for mountpoint, fstype in _mounts():
+        if pathname == mountpoint or pathname.startswith(mountpoint.rstrip("/") + "/"):
+            return fstype in NETWORK_FILESYSTEMS
+    return False
+
+
+class Watcher(abc.ABC):
+    """
+    Watcher - publishes callback(dirname, name) for each change in the watched
+    folders from a background thread: name is "" when dirname itself changed,
+    (None, None) means that events were lost and everything may have changed
+    """
+
+    def __init__(self):
+        """
+        constructor
+        """
+        self.roots = set()
+        self.subscribers = []
+        self.lock = threading.RLock()
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def subscribe(self, callback):
+        """
+        subscribe - callback(dirname, name) on every change
+        """
+        with self.lock:
+            if not callback in self.subscribers:
+                self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        """
+        unsubscribe
+        """
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def publish(self, dirname, name):
+        """
+        publish - call the subscribers, their errors are logged
+        """
+        for callback in list(self.subscribers):
+            try:
+                callback(dirname, name)
+            except Exception:
+                logger.exception("watcher callback failed for %s/%s", dirname, name)
+
+    def is_watched(self, pathname):
+        """
+        is_watched - True if changes to pathname are published
+        """
+        if not self.roots or self.thread is None:
+            return False
+        pathname = normpath(pathname)
+        for root in self.roots:
+            if pathname == root or pathname.startswith(root + "/"):
+                return True
+        return False
+
+    def watch(self, dirname):
+        """
+        watch - publish the changes of dirname and of all its subfolders
+        """
+        dirname = normpath(os.path.abspath(dirname))
+        if dirname in self.roots:
+            return True
+        with self.lock:
+            if dirname in self.roots:
+                return True
+            if not os.path.isdir(dirname):
+                return False
+            added = []
+            for pathname in [dirname] + list(iterlistdir(dirname)):
+                watching = self._watching(pathname)
+                if not self._add(pathname):
+                    # not all of it would be seen: the caches keep checking the files
+                    logger.warning("cannot watch %s", pathname)
+                    for item in added:
+                        self._remove(item)
+                    return False
+                if not watching:
+                    added.append(pathname)
+            self.roots.add(dirname)
+            self.start()
+        return True
+
+    def start(self):
+        """
+        start - the background thread
+        """
+        with self.lock:
+            if self.thread is None:
+                self.stopped.clear()
+                self.thread = threading.Thread(target=self.run, name="opensitua_watcher", daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        """
+        stop - the background thread, the folders are no longer watched
+        """
+        with self.lock:
+            thread, self.thread = self.thread, None
+            self.roots = set()
+        self.stopped.set()
+        if thread and thread is not threading.current_thread():
+            thread.join()
+
+    @abc.abstractmethod
+    def _add(self, dirname):
+        """
+        _add - watch one folder, False if it cannot be
+        """
+
+    @abc.abstractmethod
+    def _remove(self, dirname):
+        """
+        _remove - stop watching one folder
+        """
+
+    @abc.abstractmethod
+    def _watching(self, dirname):
+        """
+        _watching - True if the folder is already watched
+        """
+
+    @abc.abstractmethod
+    def run(self):
+        """
+        run - publish the changes until stop()
+        """
+
+
+class InotifyWatcher(Watcher):
+    """
+    InotifyWatcher - the kernel reports the changes, one watch per folder
+    """
+
+    def __init__(self):
+        """
+        constructor
+        """
+        Watcher.__init__(self)
+        libc = _inotify()
+        if libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            import ctypes
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self.wds = {}
+        self.paths = {}
+
+    def _add(self, dirname):
+        """
+        _add - watch one folder, not on network filesystems
+        """
+        if is_network_fs(dirname):
+            return False
+        with self.lock:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirname), WATCH_MASK)
+            if wd < 0:
+                return False
+            self.wds[wd] = dirname
+            self.paths[dirname] = wd
+            return True
+
+    def _remove(self, dirname):
+        """
+        _remove - remove the watch of one folder
+        """
+        with self.lock:
+            wd = self.paths.pop(dirname, None)
+            if wd is not None:
+                self.wds.pop(wd, None)
+                self.libc.inotify_rm_watch(self.fd, wd)
+
+    def _watching(self, dirname):
+        """
+        _watching
+        """
+        return dirname in self.paths
+
+    def _remove_tree(self, pathname):
+        """
+        _remove_tree - remove the watches of a folder moved away or deleted
+        and of its subfolders: their wds would still report the old paths
+        """
+        with self.lock:
+            items = [item for item in self.paths if item == pathname or item.startswith(pathname + "/")]
+        for item in items:
+            self._remove(item)
+
+    def _forget(self, wd):
+        """
+        _forget - the folder of wd is gone
+        """
+        with self.lock:
+            dirname = self.wds.pop(wd, None)
+            if dirname is not None and self.paths.get(dirname) == wd:
+                del self.paths[dirname]
+
+    def _events(self, data):
+        """
+        _events - (wd, mask, name) of each event in data
+        """
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            yield wd, mask, os.fsdecode(name)
+
+    def run(self):
+        """
+        run - read the events until stop()
+        """
+        while not self.stopped.is_set():
+            try:
+                ready, _, _ = select.select([self.fd], [], [], 0.5)
+                if not ready:
+                    continue
+                data = os.read(self.fd, 65536)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError:
+                logger.exception("inotify read failed")
+                break
+            for wd, mask, name in self._events(data):
+                if mask & IN_Q_OVERFLOW:
+                    self.publish(None, None)
+                    continue
+                dirname = self.wds.get(wd)
+                if dirname is None:
+                    continue
+                if mask & IN_IGNORED:
+                    self._forget(wd)
+                    continue
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and name:
+                    # new folders are watched with what they already contain
+                    pathname = dirname + "/" + name
+                    for item in [pathname] + list(iterlistdir(pathname)):
+                        self._add(item)
+                elif mask & IN_ISDIR and mask & (IN_DELETE | IN_MOVED_FROM) and name:
+                    self._remove_tree(dirname + "/" + name)
+                self.publish(dirname, "" if mask & (IN_DELETE_SELF | IN_MOVE_SELF) else name)
+
+
+class PollingWatcher(Watcher):
+    """
+    PollingWatcher - compares the content of the watched folders every
+    interval seconds, for systems and filesystems without inotify
+    """
+
+    def __init__(self, interval=WATCH_INTERVAL):
+        """
+        constructor
+        """
+        Watcher.__init__(self)
+        self.interval = interval
+        self.snapshots = {}
+
+    def _snapshot(self, dirname):
+        """
+        _snapshot - {name: (mtime, size, isdir)} of dirname, None if it is gone
+        """
+        res = {}
+        try:
+            with os.scandir(dirname) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat()
+                        res[entry.name] = (st.st_mtime_ns, st.st_size, entry.is_dir())
+                    except OSError:
+                        pass
+        except OSError:
+            return None
+        return res
+
+    def _add(self, dirname):
+        """
+        _add - remember the content of one folder
+        """
+        snapshot = self._snapshot(dirname)
+        if snapshot is None:
+            return False
+        with self.lock:
+            self.snapshots[dirname] = snapshot
+        return True
+
+    def _remove(self, dirname):
+        """
+        _remove - forget the content of one folder
+        """
+        with self.lock:
+            self.snapshots.pop(dirname, None)
+
+    def _watching(self, dirname):
+        """
+        _watching
+        """
+        return dirname in self.snapshots
+
+    def poll(self):
+        """
+        poll - publish the differences since the last poll
+        """
+        with self.lock:
+            dirnames = list(self.snapshots.keys())
+        for dirname in dirnames:
+            old, new = self.snapshots.get(dirname), self._snapshot(dirname)
+            if old is None:
+                continue
+            if new is None:
+                with self.lock:
+                    self.snapshots.pop(dirname, None)
+                self.publish(dirname, "")
+                continue
+            with self.lock:
+                self.snapshots[dirname] = new
+            for name in set(old) | set(new):
+                if old.get(name) != new.get(name):
+                    if name in new and new[name][2] and not name in old:
+                        for item in [dirname + "/" + name] + list(iterlistdir(dirname + "/" + name)):
+                            self._add(item)
+                    self.publish(dirname, name)
+
+    def run(self):
+        """
+        run - poll until stop()
+        """
+        while not self.stopped.wait(self.interval):
+            self.poll()
+
+
+_watchers = {}
+_callbacks = []
+_watcher_lock = threading.Lock()
+
+
+def get_watcher(dirname=None):
+    """
+    get_watcher - the process watcher for dirname: inotify where the system
+    has it, polling for network filesystems where inotify misses the changes
+    made by other hosts
+    """
+    kind = "poll" if os.environ.get("OPENSITUA_WATCHER", "") == "poll" or (dirname and is_network_fs(dirname)) else "inotify"
+    with _watcher_lock:
+        watcher = _watchers.get(kind)
+        if watcher is None:
+            if kind == "inotify":
+                try:
+                    watcher = InotifyWatcher()
+                except OSError:
+                    watcher = _watchers.get("poll")
+            if watcher is None:
+                watcher = PollingWatcher()
+                _watchers["poll"] = watcher
+            _watchers[kind] = watcher
+            for callback in _callbacks:
+                watcher.subscribe(callback)
+    return watcher
+
+
+def watch(dirname):
+    """
+    watch - publish the changes under dirname
+    """
+    return get_watcher(dirname).watch(dirname)
+
+
+def subscribe(callback):
+    """
+    subscribe - callback(dirname, name) for every change in the watched folders,
+    of the watchers running and of those to come
+    """
+    with _watcher_lock:
+        if not callback in _callbacks:
+            _callbacks.append(callback)
+        watchers = list(_watchers.values())
+    for watcher in watchers:
+        watcher.subscribe(callback)
+    return callback
+
+
+def is_watched(pathname):
+    """
+    is_watched - True if the changes of pathname are published, without
+    starting a watcher
+    """
+    return any([watcher.is_watched(pathname) for watcher in list(_watchers.values())])
@@ -31,5 +31,8 @@ setuptools.setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ),
-    install_requires=['jinja2','six','opensitua_core']
+    install_requires=['jinja2>=3.0','six','opensitua_core'],
+    entry_points={
+        "console_scripts": ["opensitua_warmup=opensitua_http.warmup:main"]
+    }
 )
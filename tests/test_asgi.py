@@ -0,0 +1,74 @@
+# -----------------------------------------------------------------------------
+# Name:        test_asgi.py
+# Purpose:     WSGI handlers served through ASGIApplication
+# -----------------------------------------------------------------------------
+import asyncio
+from opensitua_http.asgi import ASGIApplication
+
+
+def serve(handler, path="/"):
+    """
+    serve - one GET request through ASGIApplication, the messages sent back
+    """
+    sent = []
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        return requests.pop(0) if requests else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+    asyncio.run(ASGIApplication(handler)(scope, receive, send))
+    return sent[0], b"".join([message["body"] for message in sent[1:]])
+
+
+def test_list_body():
+    def handler(environ, start_response):
+        start_response("200 OK", [("Content-type", "text/plain")])
+        return [b"hello ", b"world"]
+    start, body = serve(handler)
+    assert start["status"] == 200 and (b"content-type", b"text/plain") in start["headers"]
+    assert body == b"hello world"
+
+
+def test_generator_calls_start_response_late():
+    closed = []
+
+    class Body:
+        def __iter__(self):
+            yield b""
+            self.start_response("201 Created", [("X-Late", "1")])
+            yield b"first"
+            yield b"second"
+
+        def close(self):
+            closed.append(True)
+
+    def handler(environ, start_response):
+        body = Body()
+        body.start_response = start_response
+        return body
+
+    start, body = serve(handler)
+    assert start["status"] == 201 and (b"x-late", b"1") in start["headers"]
+    assert body == b"firstsecond"
+    assert closed == [True]
+
+
+def test_generator_function():
+    def handler(environ, start_response):
+        start_response("200 OK", [("Content-type", "text/plain")])
+        yield b"gen"
+    start, body = serve(handler)
+    assert start["status"] == 200 and body == b"gen"
+
+
+def test_write_callable():
+    def handler(environ, start_response):
+        write = start_response("200 OK", [])
+        write(b"written ")
+        return [b"returned"]
+    start, body = serve(handler)
+    assert body == b"written returned"
@@ -0,0 +1,98 @@
+# -----------------------------------------------------------------------------
+# Name:        test_auth.py
+# Purpose:     check_user_permissions against a htaccess.sqlite
+# -----------------------------------------------------------------------------
+import os
+import time
+import sqlite3
+import pytest
+from opensitua_http import check_user_permissions, invalidate_auth_cache, md5text
+
+
+def today_digest(token):
+    """
+    today_digest - the __token__ cookie of token for today (UTC)
+    """
+    return md5text("%s%s" % (token, time.strftime("%Y-%m-%d", time.gmtime())))
+
+
+def make_app(tmp_path, users):
+    """
+    make_app - an app folder with its htaccess.sqlite holding users [(token, mail, enabled),...]
+    """
+    appdir = tmp_path / "var" / "www" / "app"
+    appdir.mkdir(parents=True)
+    conn = sqlite3.connect(str(appdir / "htaccess.sqlite"))
+    conn.execute("CREATE TABLE [users]([token] TEXT, [mail] TEXT, [enabled] INTEGER);")
+    conn.executemany("INSERT INTO [users] VALUES (?,?,?);", users)
+    conn.commit()
+    conn.close()
+    return {"SCRIPT_FILENAME": str(appdir / "index.py"), "DOCUMENT_ROOT": str(tmp_path)}
+
+
+def with_cookie(environ, value):
+    """
+    with_cookie
+    """
+    environ = dict(environ)
+    if value is not None:
+        environ["HTTP_COOKIE"] = "__token__=%s" % value
+    return environ
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    invalidate_auth_cache()
+    yield
+    invalidate_auth_cache()
+
+
+USERS = [("secret", "alice@example.com", 1), ("disabled", "bob@example.com", 0)]
+
+
+def test_valid_token(tmp_path):
+    environ = make_app(tmp_path, USERS)
+    assert check_user_permissions(with_cookie(environ, today_digest("secret"))) == "alice@example.com"
+
+
+def test_uppercase_token(tmp_path):
+    environ = make_app(tmp_path, USERS)
+    assert check_user_permissions(with_cookie(environ, today_digest("secret").upper())) == "alice@example.com"
+
+
+def test_wrong_token(tmp_path):
+    environ = make_app(tmp_path, USERS)
+    assert check_user_permissions(with_cookie(environ, today_digest("nope"))) is False
+    assert check_user_permissions(with_cookie(environ, today_digest("disabled"))) is False
+    # the cookie was matched with LIKE before: no wildcards
+    assert check_user_permissions(with_cookie(environ, "%")) is False
+
+
+def test_missing_token(tmp_path):
+    environ = make_app(tmp_path, USERS)
+    assert check_user_permissions(with_cookie(environ, None)) is False
+    assert check_user_permissions(with_cookie(environ, "")) is False
+
+
+def test_everyone(tmp_path):
+    environ = make_app(tmp_path, USERS + [(None, "everyone", 1)])
+    assert check_user_permissions(with_cookie(environ, None)) == "everyone"
+    assert check_user_permissions(with_cookie(environ, today_digest("nope"))) == "everyone"
+    assert check_user_permissions(with_cookie(environ, today_digest("secret"))) == "alice@example.com"
+
+
+def test_disabled_everyone(tmp_path):
+    environ = make_app(tmp_path, USERS + [(None, "everyone", 0)])
+    assert check_user_permissions(with_cookie(environ, None)) is False
+
+
+def test_db_change(tmp_path):
+    environ = make_app(tmp_path, USERS)
+    assert check_user_permissions(with_cookie(environ, today_digest("secret"))) == "alice@example.com"
+    filedb = os.path.join(os.path.dirname(environ["SCRIPT_FILENAME"]), "htaccess.sqlite")
+    conn = sqlite3.connect(filedb)
+    conn.execute("UPDATE [users] SET [enabled]=0 WHERE [mail]='alice@example.com';")
+    conn.execute("INSERT INTO [users] VALUES ('other', 'carol@example.com', 1);")
+    conn.commit()
+    conn.close()
+    assert check_user_permissions(with_cookie(environ, today_digest("secret"))) is False
@@ -0,0 +1,45 @@
+# -----------------------------------------------------------------------------
+# Name:        test_bytecode_cache.py
+# Purpose:     the jinja2 bytecode cache is used only when configured
+# -----------------------------------------------------------------------------
+import os
+import sys
+import subprocess
+from opensitua_http import set_bytecode_cache, get_template
+from opensitua_http.warmup import main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_without_cache_dir(tmp_path):
+    env = dict(os.environ, TMPDIR=str(tmp_path / "missing"))
+    env.pop("OPENSITUA_JINJA2_CACHE", None)
+    out = subprocess.check_output([sys.executable, "-c", "import opensitua_http.http as h; print(h._bytecode_cache)"], cwd=ROOT, env=env)
+    assert out.strip() == b"None"
+
+
+def test_configured_cache(tmp_path):
+    try:
+        cache = set_bytecode_cache(str(tmp_path / "cache"))
+        assert cache is not None
+        (tmp_path / "page.html").write_text("<p>{{x}}</p>")
+        assert get_template(str(tmp_path / "page.html")).render(x=1) == "<p>1</p>"
+        assert os.listdir(str(tmp_path / "cache"))
+        # a folder that cannot be created disables the cache instead of raising
+        (tmp_path / "file").write_text("")
+        assert set_bytecode_cache(str(tmp_path / "file" / "cache")) is None
+    finally:
+        set_bytecode_cache(os.environ.get("OPENSITUA_JINJA2_CACHE"))
+
+
+def test_warmup_warns_without_cache_dir(tmp_path, monkeypatch, capsys):
+    monkeypatch.delenv("OPENSITUA_JINJA2_CACHE", raising=False)
+    (tmp_path / "page.html").write_text("<p>{{x}}</p>")
+    try:
+        assert main([str(tmp_path)]) == 0
+        out, err = capsys.readouterr()
+        assert "warning" in err and "1 templates compiled" in out
+        assert main([str(tmp_path), "--cache-dir", str(tmp_path / "cache")]) == 0
+        assert os.listdir(str(tmp_path / "cache"))
+    finally:
+        set_bytecode_cache(os.environ.get("OPENSITUA_JINJA2_CACHE"))
@@ -0,0 +1,103 @@
+# -----------------------------------------------------------------------------
+# Name:        test_conditional.py
+# Purpose:     304 and 412 answers of htmlResponse and fileResponse
+# -----------------------------------------------------------------------------
+import os
+import time
+from opensitua_http import htmlResponse, fileResponse, is_not_modified, is_precondition_failed, httpdate
+
+
+class Response:
+    """
+    Response - a start_response recording the status and the headers
+    """
+
+    def __call__(self, status, headers, exc_info=None):
+        self.status, self.headers = status, dict(headers)
+
+
+def make_site(tmp_path):
+    """
+    make_site - a page and its version.txt
+    """
+    appdir = tmp_path / "var" / "www" / "app"
+    appdir.mkdir(parents=True)
+    (appdir / "index.html").write_text("<p>{{__version__}}</p>")
+    (tmp_path / "version.txt").write_text("1.0")
+    return {"SCRIPT_FILENAME": str(appdir / "index.py"), "DOCUMENT_ROOT": str(tmp_path), "QUERY_STRING": ""}
+
+
+def get(environ, **headers):
+    environ = dict(environ, **headers)
+    response = Response()
+    body = b"".join(htmlResponse(environ, response, conditional=True))
+    return response, body
+
+
+def test_etag_revalidation(tmp_path):
+    environ = make_site(tmp_path)
+    first, body = get(environ)
+    assert first.status == "200 OK" and b"1.0" in body
+    second, body = get(environ, HTTP_IF_NONE_MATCH=first.headers["ETag"])
+    assert second.status.startswith("304") and body == b""
+    (tmp_path / "version.txt").write_text("2.0")
+    third, body = get(environ, HTTP_IF_NONE_MATCH=first.headers["ETag"])
+    assert third.status == "200 OK" and b"2.0" in body
+
+
+def test_no_if_modified_since_for_composite_pages(tmp_path):
+    environ = make_site(tmp_path)
+    first, _ = get(environ)
+    # the page depends on more than the template mtime
+    assert "Last-Modified" not in first.headers
+    (tmp_path / "version.txt").write_text("2.0")
+    since = httpdate(time.time() + 3600)
+    second, body = get(environ, HTTP_IF_MODIFIED_SINCE=since)
+    assert second.status == "200 OK" and b"2.0" in body
+
+
+def response_date(filename):
+    return httpdate(os.stat(str(filename)).st_mtime)
+
+
+def test_file_if_modified_since(tmp_path):
+    filename = tmp_path / "a.txt"
+    filename.write_bytes(b"x" * 100)
+    response = Response()
+    fileResponse(str(filename), {}, response)
+    assert response.status == "200 OK" and "Last-Modified" in response.headers
+    response = Response()
+    fileResponse(str(filename), {"HTTP_IF_MODIFIED_SINCE": response_date(filename)}, response)
+    assert response.status.startswith("304")
+
+
+def test_is_not_modified():
+    assert is_not_modified({"HTTP_IF_NONE_MATCH": 'W/"abc", "def"'}, 'W/"def"')
+    assert not is_not_modified({"HTTP_IF_NONE_MATCH": '"abc"'}, 'W/"def"')
+    # without mtime If-Modified-Since is not a validator
+    assert not is_not_modified({"HTTP_IF_MODIFIED_SINCE": httpdate(time.time())}, 'W/"def"')
+    assert is_not_modified({"HTTP_IF_MODIFIED_SINCE": httpdate(time.time())}, 'W/"def"', time.time() - 10)
+
+
+def test_only_get_and_head_are_not_modified(tmp_path):
+    environ = make_site(tmp_path)
+    first, _ = get(environ)
+    tag = first.headers["ETag"]
+    head, body = get(environ, REQUEST_METHOD="HEAD", HTTP_IF_NONE_MATCH=tag)
+    assert head.status.startswith("304")
+    # other methods render, or get 412 when If-None-Match matches
+    post, body = get(environ, REQUEST_METHOD="POST")
+    assert post.status == "200 OK" and b"1.0" in body
+    post, body = get(environ, REQUEST_METHOD="POST", HTTP_IF_MODIFIED_SINCE=httpdate(time.time() + 3600))
+    assert post.status == "200 OK" and b"1.0" in body
+    post, body = get(environ, REQUEST_METHOD="POST", HTTP_IF_NONE_MATCH=tag)
+    assert post.status.startswith("412") and body == b""
+    post, body = get(environ, REQUEST_METHOD="POST", HTTP_IF_NONE_MATCH='"other"')
+    assert post.status == "200 OK"
+
+
+def test_is_precondition_failed():
+    assert not is_precondition_failed({"HTTP_IF_NONE_MATCH": '"def"'}, '"def"')
+    assert not is_precondition_failed({"REQUEST_METHOD": "HEAD", "HTTP_IF_NONE_MATCH": "*"}, '"def"')
+    assert is_precondition_failed({"REQUEST_METHOD": "PUT", "HTTP_IF_NONE_MATCH": "*"}, '"def"')
+    assert not is_not_modified({"REQUEST_METHOD": "PUT", "HTTP_IF_NONE_MATCH": "*"}, '"def"')
@@ -0,0 +1,44 @@
+# -----------------------------------------------------------------------------
+# Name:        test_encoder.py
+# Purpose:     the json backends of JSONResponse agree
+# -----------------------------------------------------------------------------
+import json
+import pytest
+from opensitua_http.encoder import JSON_ENCODERS
+
+NAN, INF = float("nan"), float("inf")
+CASES = [
+    {"value": NAN, "range": [1.5, INF, (-INF, 2)], "name": "dem"},
+    {"nested": {"nodata": [{"v": NAN}]}},
+    [1, 2, "s", None, True],
+]
+
+
+@pytest.mark.parametrize("name", sorted(JSON_ENCODERS))
+def test_non_finite_floats_are_null(name):
+    for obj in CASES:
+        data = JSON_ENCODERS[name](obj)
+        assert b"NaN" not in data and b"Infinity" not in data
+        # strict json
+        json.loads(data, parse_constant=lambda value: pytest.fail("invalid json constant %s" % value))
+    assert json.loads(JSON_ENCODERS[name](CASES[0])) == {"value": None, "range": [1.5, None, [None, 2]], "name": "dem"}
+
+
+def test_numpy_non_finite():
+    np = pytest.importorskip("numpy")
+    for name in JSON_ENCODERS:
+        assert json.loads(JSON_ENCODERS[name]({"a": np.array([1.0, np.nan]), "b": np.float32(np.inf)})) == {"a": [1.0, None], "b": None}
+
+
+def test_backends_agree():
+    if len(JSON_ENCODERS) < 2:
+        pytest.skip("orjson is not installed")
+    for obj in CASES:
+        assert len(set([json.dumps(json.loads(encoder(obj))) for encoder in JSON_ENCODERS.values()])) == 1
+
+
+def test_circular_reference():
+    obj = []
+    obj.append(obj)
+    with pytest.raises(ValueError):
+        JSON_ENCODERS["json"](obj)
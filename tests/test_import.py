@@ -0,0 +1,50 @@
+# -----------------------------------------------------------------------------
+# Name:        test_import.py
+# Purpose:     "import opensitua_http" stays light: GDAL, numpy, the mapfile
+#              and asgi modules are loaded only when one of their names is used
+# -----------------------------------------------------------------------------
+import os
+import sys
+import json
+import subprocess
+
+HEAVY = ("osgeo", "numpy", "opensitua_http.mapfile", "opensitua_http.asgi", "asyncio")
+MAX_MS = 250.0
+
+CHILD = """
+import sys, time, json
+t0 = time.perf_counter()
+import opensitua_http
+from opensitua_http import Params, htmlResponse, JSONResponse, Router
+t1 = time.perf_counter()
+print(json.dumps({"ms": (t1 - t0) * 1000, "loaded": [name for name in %r if name in sys.modules]}))
+""" % (HEAVY,)
+
+
+def run(code):
+    """
+    run - the last line printed by code in a fresh interpreter, as json
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.check_output([sys.executable, "-c", code], cwd=root)
+    return json.loads(out.decode("utf-8").strip().splitlines()[-1])
+
+
+def test_no_heavy_modules():
+    assert run(CHILD)["loaded"] == []
+
+
+def test_import_time():
+    # the best of a few runs: the first one may pay for a cold disk cache
+    assert min([run(CHILD)["ms"] for j in range(3)]) < MAX_MS
+
+
+def test_lazy_names():
+    res = run("""
+import sys, json
+import opensitua_http
+before = "opensitua_http.asgi" in sys.modules
+f = opensitua_http.ASGIApplication
+print(json.dumps({"before": before, "after": "opensitua_http.asgi" in sys.modules, "dir": "ASGIApplication" in dir(opensitua_http)}))
+""")
+    assert res == {"before": False, "after": True, "dir": True}
@@ -0,0 +1,109 @@
+# -----------------------------------------------------------------------------
+# Name:        test_multipart.py
+# Purpose:     the streaming multipart/form-data parser
+# -----------------------------------------------------------------------------
+import io
+import pytest
+from opensitua_http.multipart import parse_multipart, parse_form, RequestTooLarge
+
+BOUNDARY = b"----b0undary"
+CONTENT = bytes(range(256)) * 4 + b"\r\n--" + BOUNDARY[:-1] + b"\r\n"
+
+
+def body(content=CONTENT):
+    """
+    body - a text field, a file and a field with an accented value
+    """
+    return b"".join([
+        b"preamble\r\n",
+        b"--" + BOUNDARY + b"\r\n",
+        b'Content-Disposition: form-data; name="title"\r\n\r\n',
+        b"hello world\r\n",
+        b"--" + BOUNDARY + b"\r\n",
+        b'Content-Disposition: form-data; name="upload"; filename="a \\"b\\".bin"\r\n',
+        b"Content-Type: application/octet-stream\r\n\r\n",
+        content + b"\r\n",
+        b"--" + BOUNDARY + b"\r\n",
+        b'Content-Disposition: form-data; name="city"\r\n',
+        b"Content-Type: text/plain; charset=utf-8\r\n\r\n",
+        "Forlì".encode("utf-8") + b"\r\n",
+        b"--" + BOUNDARY + b"--\r\n",
+    ])
+
+
+def chunked(data, size):
+    """
+    chunked - data by chunks of size bytes
+    """
+    return [data[j:j + size] for j in range(0, len(data), size)]
+
+
+def environ(data, length=True):
+    """
+    environ - a POST request with data as multipart body
+    """
+    res = {
+        "REQUEST_METHOD": "POST",
+        "CONTENT_TYPE": "multipart/form-data; boundary=%s" % BOUNDARY.decode("latin-1"),
+        "wsgi.input": io.BytesIO(data),
+    }
+    if length:
+        res["CONTENT_LENGTH"] = str(len(data))
+    return res
+
+
+def check(fields, content=CONTENT):
+    assert fields["title"] == ["hello world"]
+    assert fields["city"] == ["Forlì"]
+    upload = fields["upload"][0]
+    assert upload.filename == 'a "b".bin'
+    assert upload.content_type == "application/octet-stream"
+    assert upload.read() == content
+    assert len(upload) == len(content)
+    upload.close()
+
+
+def test_chunk_boundaries():
+    data = body()
+    # every chunk size splits the delimiters and the headers somewhere else
+    for size in list(range(1, 80)) + [127, 128, 1000, len(data)]:
+        check(parse_multipart(chunked(data, size), BOUNDARY))
+
+
+def test_every_split_point():
+    data = body(b"x\r\n-y")
+    for j in range(1, len(data)):
+        check(parse_multipart([data[:j], data[j:]], BOUNDARY), b"x\r\n-y")
+
+
+def test_spooling():
+    fields = parse_multipart(chunked(body(), 100), BOUNDARY, spool_threshold=64)
+    upload = fields["upload"][0]
+    assert upload.path is not None
+    assert b"".join(upload) == CONTENT
+    check(fields)
+
+    fields = parse_multipart(chunked(body(), 100), BOUNDARY)
+    assert fields["upload"][0].path is None
+    check(fields)
+
+
+def test_parse_form():
+    check(parse_form(environ(body())))
+    check(parse_form(environ(body(), length=False)))
+
+
+def test_size_limit():
+    data = body()
+    with pytest.raises(RequestTooLarge):
+        parse_form(environ(data), max_content_length=len(data) - 1)
+    # without Content-Length the limit holds while reading
+    with pytest.raises(RequestTooLarge):
+        parse_form(environ(data, length=False), max_content_length=len(data) - 1)
+    check(parse_form(environ(data), max_content_length=len(data)))
+
+
+def test_truncated():
+    data = body()
+    with pytest.raises(ValueError):
+        parse_multipart(chunked(data[:len(data) // 2], 64), BOUNDARY)
@@ -0,0 +1,72 @@
+# -----------------------------------------------------------------------------
+# Name:        test_params.py
+# Purpose:     LazyParams returns what Params returns
+# -----------------------------------------------------------------------------
+import io
+import pytest
+from opensitua_http import Params, LazyParams
+
+BOUNDARY = "----b0undary"
+
+
+def multipart(fields):
+    """
+    multipart - a multipart/form-data body of text fields
+    """
+    data = b""
+    for name, value in fields:
+        data += ("--%s\r\nContent-Disposition: form-data; name=\"%s\"\r\n\r\n%s\r\n" % (BOUNDARY, name, value)).encode("utf-8")
+    return data + ("--%s--\r\n" % BOUNDARY).encode("utf-8")
+
+
+def get(query, **extra):
+    return lambda: dict({"REQUEST_METHOD": "GET", "QUERY_STRING": query}, **extra)
+
+
+def post(body, query="", content_type="application/x-www-form-urlencoded", **extra):
+    return lambda: dict({"REQUEST_METHOD": "POST", "QUERY_STRING": query, "CONTENT_TYPE": content_type,
+                         "CONTENT_LENGTH": str(len(body)), "wsgi.input": io.BytesIO(body)}, **extra)
+
+
+def plain(**items):
+    return lambda: dict(items)
+
+
+ENVIRONS = {
+    "get": get("a=1&b=2&b=3&c=<x>"),
+    "get_root_cookie": get("a=1&DOCUMENT_ROOT=/evil", DOCUMENT_ROOT="/x", HTTP_COOKIE="__token__=abc; b=2"),
+    "get_encoded": get("encoded=true&a=aGVsbG8="),
+    "post": post(b"a=1&b=2&b=3", "b=q&c=4"),
+    "post_encoded": post(b"encoded=true&a=aGVsbG8=", DOCUMENT_ROOT="/x"),
+    "post_encoded_query": post(b"encoded=true&a=aGVsbG8=", "c=d2h5"),
+    "post_multipart": post(multipart([("a", "1"), ("t", "héllo"), ("encoded", "1"), ("x", "aGVsbG8=")]), "k=v",
+                           "multipart/form-data; boundary=%s" % BOUNDARY, HTTP_COOKIE="b=2"),
+    "put": lambda: {"REQUEST_METHOD": "PUT", "QUERY_STRING": "a=1", "DOCUMENT_ROOT": "/x"},
+    "plain": plain(a=1, b=[1, 2]),
+    "plain_root_cookie": plain(filename="/data/a.tif", DOCUMENT_ROOT="/x", HTTP_COOKIE="a=1; b=2"),
+    "plain_cookie_dict": plain(HTTP_COOKIE={"a": "1"}),
+}
+
+
+@pytest.mark.parametrize("name", sorted(ENVIRONS))
+def test_same_dictionary(name):
+    expected = Params(ENVIRONS[name]()).toDictionary()
+    lazy = LazyParams(ENVIRONS[name]())
+    assert lazy.toDictionary() == expected
+    assert sorted(lazy.keys()) == sorted(expected.keys())
+
+
+@pytest.mark.parametrize("name", sorted(ENVIRONS))
+def test_same_values(name):
+    params = Params(ENVIRONS[name]())
+    for key in list(params.keys()) + ["missing"]:
+        # a fresh LazyParams per key: each lookup parses only what it needs
+        lazy = LazyParams(ENVIRONS[name]())
+        assert lazy.get(key, "default") == params.get(key, "default"), key
+        assert lazy.getvalue(key, "default") == params.getvalue(key, "default"), key
+
+
+def test_plain_document_www():
+    lazy = LazyParams({"DOCUMENT_ROOT": "/x", "HTTP_COOKIE": "a=1; b=2"})
+    assert lazy.getvalue("DOCUMENT_WWW").replace("\\", "/").endswith("/x/var/www")
+    assert lazy.getvalue("HTTP_COOKIE") == {"a": "1", "b": "2"}
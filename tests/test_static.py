@@ -0,0 +1,100 @@
+# -----------------------------------------------------------------------------
+# Name:        test_static.py
+# Purpose:     staticResponse and the Range requests of fileResponse
+# -----------------------------------------------------------------------------
+import os
+import pytest
+from opensitua_http import staticResponse, fileResponse, MAX_RANGES
+
+
+class Response:
+    """
+    Response - a start_response recording the status and the headers
+    """
+
+    def __call__(self, status, headers, exc_info=None):
+        self.status, self.headers = status, dict(headers)
+
+
+@pytest.fixture
+def www(tmp_path):
+    root = tmp_path / "var" / "www"
+    (root / "app" / ".git").mkdir(parents=True)
+    (root / "lib" / "js").mkdir(parents=True)
+    (root / "lib" / "js" / "a.js").write_text("var a=1;")
+    (root / "app" / "index.html").write_text("<p></p>")
+    for name in ("htaccess.sqlite", "data.SQLITE", "index.py", "layer.map", ".env", "htaccess.bak"):
+        (root / "app" / name).write_text("secret")
+    (root / "app" / ".git" / "config").write_text("secret")
+    os.symlink(str(root / "app" / "htaccess.sqlite"), str(root / "lib" / "users.txt"))
+    return root
+
+
+def get(root, path, **headers):
+    environ = dict({"PATH_INFO": path}, **headers)
+    response = Response()
+    body = b"".join(staticResponse(environ, response, str(root)))
+    return response, body
+
+
+@pytest.mark.parametrize("path", ["/lib/js/a.js", "/app/index.html"])
+def test_served(www, path):
+    response, body = get(www, path)
+    assert response.status == "200 OK" and body
+
+
+@pytest.mark.parametrize("path", ["/app/htaccess.sqlite", "/app/data.SQLITE", "/app/index.py", "/app/layer.map",
+                                  "/app/.env", "/app/.git/config", "/app/htaccess.bak", "/lib/users.txt",
+                                  "/../../etc/passwd", "/app/../app/htaccess.sqlite", "/", "/app"])
+def test_refused(www, path):
+    response, body = get(www, path)
+    assert response.status.startswith("404") and b"secret" not in body
+
+
+def ranged(filename, header):
+    response = Response()
+    body = b"".join(fileResponse(str(filename), {"HTTP_RANGE": header}, response))
+    return response, body
+
+
+@pytest.fixture
+def data(tmp_path):
+    filename = tmp_path / "data.bin"
+    filename.write_bytes(bytes(range(256)) * 4)
+    return filename
+
+
+def test_single_range(data):
+    response, body = ranged(data, "bytes=10-19")
+    assert response.status.startswith("206") and body == (bytes(range(256)) * 4)[10:20]
+    assert response.headers["Content-Range"] == "bytes 10-19/1024"
+
+
+def test_overlapping_ranges_are_merged(data):
+    # the same range 200 times is one range, not 200 copies of the file
+    response, body = ranged(data, "bytes=" + ",".join(["0-"] * 200))
+    assert response.status.startswith("206") and len(body) == 1024
+    response, body = ranged(data, "bytes=0-9,5-19,20-29,-10")
+    assert response.status.startswith("206") and response.headers["Content-type"].startswith("multipart/byteranges")
+    assert body.count(b"Content-Range") == 2
+    assert b"bytes 0-29/1024" in body and b"bytes 1014-1023/1024" in body
+    assert int(response.headers["Content-Length"]) == len(body)
+
+
+def test_too_many_ranges(data):
+    header = "bytes=" + ",".join(["%d-%d" % (j * 10, j * 10) for j in range(MAX_RANGES + 1)])
+    response, body = ranged(data, header)
+    assert response.status == "200 OK" and len(body) == 1024
+    header = "bytes=" + ",".join(["%d-%d" % (j * 10, j * 10) for j in range(MAX_RANGES)])
+    response, body = ranged(data, header)
+    assert response.status.startswith("206")
+
+
+def test_unsatisfiable(data):
+    response, body = ranged(data, "bytes=2000-")
+    assert response.status.startswith("416") and body == b""
+
+
+def test_without_start_response(data):
+    assert b"".join(fileResponse(str(data), {"HTTP_RANGE": "bytes=0-9"}, None)) == bytes(range(10))
+    assert fileResponse(str(data), {"HTTP_RANGE": "bytes=2000-"}, None) == []
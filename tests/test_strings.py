@@ -0,0 +1,40 @@
+# -----------------------------------------------------------------------------
+# Name:        test_strings.py
+# Purpose:     split against the char by char implementation on random inputs
+# -----------------------------------------------------------------------------
+import random
+import pytest
+from opensitua_http.strings import split, _split_legacy
+
+ALPHABET = "ab ,;=\"'"
+CASES = [(" ", "'"), (",", "\""), (";", "\""), ("=", ""), (", ", "\""), ("ab", "'"), ("aa", "a"),
+         ("'", "'"), (",", "\"'"), ("; ", ""), ("a", "a"), ("", "\"")]
+
+
+@pytest.mark.parametrize("sep,glue", CASES)
+def test_split_agrees_with_legacy(sep, glue):
+    rnd = random.Random("%s|%s" % (sep, glue))
+    for j in range(2000):
+        text = "".join([rnd.choice(ALPHABET) for k in range(rnd.randint(0, 30))])
+        for removeEmpty in (False, True):
+            expected = _split_legacy(text, sep, glue, removeEmpty)
+            assert split(text, sep, glue, removeEmpty) == expected, (text, removeEmpty)
+
+
+@pytest.mark.parametrize("text,sep,glue,expected", [
+    ("a,b,c", ",", "\"", ["a", "b", "c"]),
+    ("a,\"b,c\",d", ",", "\"", ["a", "\"b,c\"", "d"]),
+    # only the first char of a longer sep is dropped
+    ("k1=v1; k2=\"x; y\"", "; ", "\"", ["k1=v1", " k2=\"x; y\""]),
+    ("", ",", "\"", [""]),
+    (",a,,b,", ",", "\"", ["", "a", "", "b", ""]),
+])
+def test_split_examples(text, sep, glue, expected):
+    assert split(text, sep, glue) == expected
+
+
+def test_split_non_strings():
+    assert split(["a", "b"], ",") == _split_legacy(["a", "b"], ",") == ["ab"]
+    for value in (None, 12):
+        with pytest.raises(TypeError):
+            split(value, ",")
@@ -0,0 +1,147 @@
+# -----------------------------------------------------------------------------
+# Name:        test_watcher.py
+# Purpose:     change events, partial watches and network filesystems
+# -----------------------------------------------------------------------------
+import os
+import time
+import pytest
+from opensitua_http import watcher as module
+from opensitua_http.watcher import Watcher, PollingWatcher, InotifyWatcher, is_network_fs, get_watcher
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for name in ("a", "a/b", "a/b/c", "d"):
+        (tmp_path / name).mkdir()
+    return tmp_path
+
+
+@pytest.fixture
+def clean_watchers():
+    saved = dict(module._watchers), list(module._callbacks)
+    module._watchers.clear()
+    yield
+    for watcher in set(module._watchers.values()):
+        watcher.stop()
+    module._watchers.clear()
+    module._watchers.update(saved[0])
+    module._callbacks[:] = saved[1]
+
+
+def mounts(monkeypatch, items):
+    items = sorted(items, key=lambda item: len(item[0]), reverse=True)
+    monkeypatch.setattr(module, "_mounts", lambda: items)
+
+
+def wait_for(events, predicate, seconds=3.0):
+    t0 = time.time()
+    while time.time() - t0 < seconds:
+        if predicate(list(events)):
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_watcher_is_abstract():
+    with pytest.raises(TypeError):
+        Watcher()
+
+
+def test_partial_watch_is_rolled_back(tree):
+    class Failing(PollingWatcher):
+        def _add(self, dirname):
+            if dirname.endswith("/c"):
+                return False
+            return PollingWatcher._add(self, dirname)
+
+    watcher = Failing(interval=60)
+    root = str(tree).replace(os.sep, "/")
+    assert watcher.watch(root + "/d")
+    assert not watcher.watch(root)
+    # the folders of the failed watch are gone, the earlier watch is kept
+    assert sorted(watcher.snapshots) == [root + "/d"]
+    assert not watcher.is_watched(root + "/a")
+    watcher.stop()
+
+
+def test_network_filesystems(monkeypatch, tree):
+    root = os.path.realpath(str(tree))
+    mounts(monkeypatch, [("/", "ext4"), (root + "/a", "nfs4"), (root + "/d", "cifs"), (root + "/dx", "ext4")])
+    assert is_network_fs(root + "/a/b")
+    assert is_network_fs(root + "/d")
+    assert not is_network_fs(root)
+    mounts(monkeypatch, [])
+    assert not is_network_fs(root)
+
+
+def test_network_roots_are_polled(monkeypatch, tree, clean_watchers):
+    root = os.path.realpath(str(tree))
+    mounts(monkeypatch, [("/", "ext4"), (root + "/a", "nfs")])
+    assert isinstance(get_watcher(root + "/a"), PollingWatcher)
+    if module._inotify() is not None and not os.environ.get("OPENSITUA_WATCHER"):
+        local = get_watcher(root + "/d")
+        assert isinstance(local, InotifyWatcher)
+        # an nfs mount below a local root: inotify refuses, the caches keep checking
+        assert not local.watch(root)
+        assert local.paths == {}
+
+
+def test_subscribe_reaches_later_watchers(tree, clean_watchers):
+    callback = lambda dirname, name: None
+    module.subscribe(callback)
+    watcher = get_watcher(str(tree))
+    assert callback in watcher.subscribers
+
+
+@pytest.mark.parametrize("kind", ["poll", "inotify"])
+def test_events(tree, kind):
+    if kind == "inotify" and module._inotify() is None:
+        pytest.skip("inotify is not available")
+    watcher = PollingWatcher(interval=0.05) if kind == "poll" else InotifyWatcher()
+    events = []
+    watcher.subscribe(lambda dirname, name: events.append((dirname, name)))
+    root = str(tree).replace(os.sep, "/")
+    assert watcher.watch(root)
+    assert watcher.is_watched(root + "/a/b/c/x.txt")
+    (tree / "a" / "b" / "c" / "x.txt").write_text("x")
+    assert wait_for(events, lambda items: (root + "/a/b/c", "x.txt") in items)
+    watcher.stop()
+
+
+def test_moved_away_folders_are_unwatched(tree):
+    if module._inotify() is None:
+        pytest.skip("inotify is not available")
+    watcher = InotifyWatcher()
+    events = []
+    watcher.subscribe(lambda dirname, name: events.append((dirname, name)))
+    root = str(tree).replace(os.sep, "/")
+    assert watcher.watch(root + "/a")
+    os.rename(str(tree / "a" / "b"), str(tree / "d" / "b"))
+    assert wait_for(events, lambda items: (root + "/a", "b") in items)
+    # the old wds would report d/b/c as a/b/c
+    assert watcher.paths == {root + "/a": watcher.paths[root + "/a"]}
+    (tree / "d" / "b" / "c" / "x.txt").write_text("x")
+    time.sleep(0.2)
+    assert not [item for item in events if item[0].startswith(root + "/a/b")]
+    watcher.stop()
+
+
+@pytest.mark.parametrize("kind", ["poll", "inotify"])
+def test_parent_rename_drops_the_assets(tmp_path, monkeypatch, clean_watchers, kind):
+    from opensitua_http import http
+    if kind == "inotify" and module._inotify() is None:
+        pytest.skip("inotify is not available")
+    monkeypatch.setenv("OPENSITUA_WATCHER", kind)
+    monkeypatch.setattr(http, "_watched", {})
+    www = tmp_path / "var" / "www"
+    (www / "lib" / "js").mkdir(parents=True)
+    (www / "lib" / "js" / "a.js").write_text("a")
+    (tmp_path / "new" / "js").mkdir(parents=True)
+    (tmp_path / "new" / "js" / "z.js").write_text("z")
+    root = str(www).replace(os.sep, "/")
+    assert http.watch_caches(root)
+    assert "/lib/js/a.js" in http.loadlibs(root + "/lib/js", "js", "1")
+    os.rename(str(www / "lib"), str(www / "lib_old"))
+    os.rename(str(tmp_path / "new"), str(www / "lib"))
+    assert wait_for([None], lambda _: "/lib/js/z.js" in http.loadlibs(root + "/lib/js", "js", "1"))
+    assert "/lib/js/a.js" not in http.loadlibs(root + "/lib/js", "js", "1")